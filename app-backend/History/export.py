@@ -0,0 +1,155 @@
+import csv
+import io
+import json
+import boto3
+import os
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from boto3.dynamodb.conditions import Key
+from foods import get_food_index, hydrate_food
+
+# ============================================================
+# XUẤT TOÀN BỘ LỊCH SỬ ĂN UỐNG (CSV / NDJSON)
+# Đọc từng trang DynamoDB bằng generator, ghi từng dòng thẳng lên S3 (multipart upload)
+# -> bộ nhớ cố định (~1 part) dù lịch sử dài bao nhiêu năm. Trả về link tải có hạn.
+# (Lambda Python sau HTTP API không stream được response nên file đi qua S3.)
+# ============================================================
+
+dynamodb = boto3.resource('dynamodb')
+TABLE_LOGS = dynamodb.Table(os.environ.get('LOGS_TABLE', 'FoodMind-MealLogs'))
+s3 = boto3.client('s3')
+EXPORT_BUCKET = os.environ.get('EXPORT_BUCKET', 'foodmind-exports')
+
+PAGE_SIZE = 200                 # Số log mỗi lượt query
+PART_SIZE = 5 * 1024 * 1024     # Part nhỏ nhất S3 cho phép (trừ part cuối)
+URL_TTL = 900                   # Link tải sống 15 phút
+CSV_COLUMNS = ['date', 'mealType', 'loggedAt', 'FoodID', 'FoodName', 'Portion', 'Calorie', 'Unit', 'mealTotalCalories']
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson'
+}
+
+def get_vietnam_time():
+    return datetime.utcnow() + timedelta(hours=7)
+
+def iter_logs(user_id):
+    # Lần lượt từng trang (LastEvaluatedKey), cũ -> mới; mỗi lúc chỉ giữ 1 trang
+    kwargs = {'KeyConditionExpression': Key('sub').eq(user_id), 'Limit': PAGE_SIZE}
+    while True:
+        res = TABLE_LOGS.query(**kwargs)
+        yield from res.get('Items', [])
+        if 'LastEvaluatedKey' not in res: return
+        kwargs['ExclusiveStartKey'] = res['LastEvaluatedKey']
+
+def format_time(logged_at):
+    if not logged_at: return ''
+    return datetime.fromtimestamp(int(logged_at) + 7 * 3600).strftime('%Y-%m-%d %H:%M:%S')
+
+def iter_csv(items, catalog):
+    # 1 dòng / món; dùng lại 1 buffer nhỏ cho csv.writer. Tên / đơn vị món lấy từ catalog
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    def flush():
+        line = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return line.encode('utf-8')
+
+    buf.write('\ufeff')  # BOM để Excel đọc đúng tiếng Việt
+    writer.writerow(CSV_COLUMNS)
+    yield flush()
+    for item in items:
+        base = [item.get('dateShort'), item.get('mealType'), format_time(item.get('loggedAt'))]
+        for f in [hydrate_food(f, catalog) for f in item.get('foods', [])] or [{}]:
+            writer.writerow(base + [f.get('FoodID', ''), f.get('FoodName', ''), f.get('Portion', ''),
+                                    f.get('Calorie', ''), f.get('Unit', ''), item.get('totalCalories', '')])
+        yield flush()
+
+def iter_ndjson(items, catalog):
+    # 1 dòng JSON / bữa (kèm danh sách món)
+    for item in items:
+        row = {
+            "date": item.get('dateShort'),
+            "mealType": item.get('mealType'),
+            "loggedAt": format_time(item.get('loggedAt')),
+            "totalCalories": item.get('totalCalories'),
+            "foods": [hydrate_food(f, catalog) for f in item.get('foods', [])]
+        }
+        yield (json.dumps(row, cls=DecimalEncoder, ensure_ascii=False) + '\n').encode('utf-8')
+
+class S3MultipartWriter:
+    # Gom byte đến PART_SIZE rồi đẩy 1 part -> bộ nhớ tối đa ~PART_SIZE
+    def __init__(self, bucket, key, content_type):
+        self.bucket, self.key = bucket, key
+        self.upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType=content_type)['UploadId']
+        self.parts = []
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= PART_SIZE: self._upload_part()
+
+    def _upload_part(self):
+        number = len(self.parts) + 1
+        res = s3.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                             PartNumber=number, Body=bytes(self.buffer))
+        self.parts.append({'ETag': res['ETag'], 'PartNumber': number})
+        self.buffer = bytearray()
+
+    def close(self):
+        if self.buffer or not self.parts: self._upload_part()
+        s3.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                     MultipartUpload={'Parts': self.parts})
+
+    def abort(self):
+        s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+def lambda_handler(event, context):
+    params = event.get('queryStringParameters') or {}
+    user_id = params.get('userId')
+    if not user_id: return resp(400, {"error": "Missing userId"})
+    fmt = params.get('format', 'csv')
+    if fmt not in FORMATS: return resp(400, {"error": "format must be csv or ndjson"})
+
+    try:
+        stamp = get_vietnam_time().strftime('%Y%m%d-%H%M%S')
+        filename = f"foodmind-history-{stamp}.{fmt}"
+        key = f"exports/{user_id}/{int(time.time())}-{filename}"
+
+        # 1. DynamoDB (từng trang) -> dòng CSV / NDJSON -> S3 (từng part)
+        rows = iter_csv if fmt == 'csv' else iter_ndjson
+        writer = S3MultipartWriter(EXPORT_BUCKET, key, FORMATS[fmt])
+        try:
+            for chunk in rows(iter_logs(user_id), get_food_index()):
+                writer.write(chunk)
+            writer.close()
+        except Exception:
+            writer.abort()
+            raise
+
+        # 2. Link tải trực tiếp từ S3 (tên file gợi ý cho trình duyệt)
+        url = s3.generate_presigned_url('get_object', Params={
+            'Bucket': EXPORT_BUCKET,
+            'Key': key,
+            'ResponseContentDisposition': f'attachment; filename="{filename}"'
+        }, ExpiresIn=URL_TTL)
+
+        return resp(200, {"url": url, "fileName": filename, "expiresIn": URL_TTL})
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return resp(500, {"error": str(e)})
+
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, Decimal): return float(obj)
+        return super(DecimalEncoder, self).default(obj)
+
+def resp(code, body):
+    return {
+        "statusCode": code,
+        "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
+        "body": json.dumps(body, cls=DecimalEncoder, ensure_ascii=False)
+    }
@@ -1,31 +1,103 @@
+import base64
 import json
 import boto3
+import hashlib
 import os
 from datetime import datetime, timedelta
 from decimal import Decimal
 from boto3.dynamodb.conditions import Key
+from foods import get_food_index, get_food_index_version, hydrate_food
 
 dynamodb = boto3.resource('dynamodb')
 TABLE_LOGS = dynamodb.Table(os.environ.get('LOGS_TABLE', 'FoodMind-MealLogs'))
+TABLE_STATS = dynamodb.Table(os.environ.get('STATS_TABLE', 'FoodMind-UserStats'))
+
+# Bộ đếm số lần ghi log (item VERSION do log_meal tăng) -> dùng cho ETag
+VERSION_KEY = 'VERSION'
+
+# Phân trang: mỗi trang tối đa MAX_LIMIT bữa (≈ 1 tuần / trang mặc định) -> độ trễ, bộ nhớ bị chặn
+DEFAULT_LIMIT = 21
+MAX_LIMIT = 200
+# Chỉ đọc thuộc tính cần hiển thị
+LOG_FIELDS = {
+    'ProjectionExpression': '#d, #s, #m, #c, #f',
+    'ExpressionAttributeNames': {'#d': 'dateMeal', '#s': 'dateShort', '#m': 'mealType',
+                                 '#c': 'totalCalories', '#f': 'foods'}
+}
 
 def get_vietnam_time():
     return datetime.utcnow() + timedelta(hours=7)
 
+def get_log_version(user_id):
+    item = TABLE_STATS.get_item(
+        Key={'sub': user_id, 'statKey': VERSION_KEY},
+        ProjectionExpression='#l',
+        ExpressionAttributeNames={'#l': 'logs'}
+    ).get('Item')
+    return (item or {}).get('logs', 0)
+
+def get_history_etag(log_version, catalog_version, *params):
+    # Lịch sử chỉ đổi khi log thêm bữa, đổi catalog (tên món) hoặc khoảng ngày đổi (sang ngày mới / tham số khác)
+    raw = '|'.join(str(p) for p in (log_version, catalog_version, *params))
+    return '"' + hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20] + '"'
+
+def get_if_none_match(event):
+    headers = event.get('headers') or {}
+    value = headers.get('if-none-match') or headers.get('If-None-Match') or ''
+    return [v.strip().removeprefix('W/') for v in value.split(',') if v.strip()]
+
+def parse_date(value):
+    # 'YYYY-MM-DD' -> chính nó; sai định dạng -> ValueError
+    return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+
+def encode_cursor(last_key):
+    # Con trỏ "mờ": chỉ chứa dateMeal của LastEvaluatedKey (sub lấy từ userId của request)
+    raw = json.dumps({'dm': last_key['dateMeal']}).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, user_id, lower, upper):
+    # Con trỏ phải nằm trong khoảng đang query: dùng lại con trỏ với from / to khác -> 400,
+    # không để DynamoDB báo lỗi ExclusiveStartKey nằm ngoài khoảng (500)
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    date_meal = json.loads(raw)['dm']
+    if not isinstance(date_meal, str) or date_meal > upper or (lower and date_meal < lower):
+        raise ValueError('cursor out of range')
+    return {'sub': user_id, 'dateMeal': date_meal}
+
 def lambda_handler(event, context):
-    user_id = event.get('queryStringParameters', {}).get('userId')
+    params = event.get('queryStringParameters') or {}
+    user_id = params.get('userId')
     if not user_id: return resp(400, {"error": "Missing userId"})
 
+    # 1. Tham số: from / to (YYYY-MM-DD, mặc định từ đầu đến hôm nay), limit (số bữa / trang), cursor
+    try:
+        today = get_vietnam_time().strftime('%Y-%m-%d')
+        date_from = parse_date(params['from']) if params.get('from') else None
+        date_to = parse_date(params['to']) if params.get('to') else today
+        limit = int(params.get('limit', DEFAULT_LIMIT))
+        cursor = params.get('cursor')
+        upper = f"{date_to}#~"  # '~' lớn hơn mọi tên bữa -> lấy trọn ngày 'to'
+        start_key = decode_cursor(cursor, user_id, date_from, upper) if cursor else None
+    except (ValueError, KeyError, TypeError):
+        return resp(400, {"error": "Invalid from / to / limit / cursor"})
+    if not 1 <= limit <= MAX_LIMIT: return resp(400, {"error": f"limit must be 1-{MAX_LIMIT}"})
+    if date_from and date_from > date_to: return resp(400, {"error": "from must be before to"})
+
     try:
-        # 1. Xác định khoảng thời gian (7 ngày gần nhất)
-        today = get_vietnam_time()
-        start_date = (today - timedelta(days=6)).strftime('%Y-%m-%d')
+        # Trình duyệt đã có đúng trang này -> 304, không query log
+        catalog = get_food_index()  # Log mới chỉ lưu FoodID -> lấy tên món từ catalog
+        etag = get_history_etag(get_log_version(user_id), get_food_index_version(),
+                                date_from, date_to, limit, cursor)
+        if etag in get_if_none_match(event): return not_modified(etag)
         
-        # 2. Query DynamoDB
-        # Lấy tất cả các bữa ăn từ ngày start_date trở đi
-        logs_res = TABLE_LOGS.query(
-            KeyConditionExpression=Key('sub').eq(user_id) & Key('dateMeal').gte(start_date)
-        )
+        # 2. Query DynamoDB: dateMeal = '<ngày>#<bữa>', đọc từ mới đến cũ, đúng 1 trang
+        key_cond = Key('sub').eq(user_id) & (
+            Key('dateMeal').between(date_from, upper) if date_from else Key('dateMeal').lte(upper))
+        query = {'KeyConditionExpression': key_cond, 'ScanIndexForward': False, 'Limit': limit, **LOG_FIELDS}
+        if start_key: query['ExclusiveStartKey'] = start_key
+        logs_res = TABLE_LOGS.query(**query)
         items = logs_res.get('Items', [])
+        last_key = logs_res.get('LastEvaluatedKey')
 
         # 3. Gom nhóm theo Ngày (Grouping by Date)
         # Cấu trúc mong muốn: { "2025-12-08": { total: 2000, meals: [...] }, ... }
@@ -47,18 +119,23 @@ def lambda_handler(event, context):
             history_map[date_str]["totalCalories"] += cal
             
             # Thêm thông tin bữa ăn (Sáng/Trưa/Tối)
+            foods = [hydrate_food(f, catalog) for f in item.get('foods', [])]
             history_map[date_str]["meals"].append({
                 "mealType": item.get('mealType'), # breakfast, lunch...
                 "calories": int(cal),
-                "foodCount": len(item.get('foods', [])),
-                "foodNames": ", ".join([f['FoodName'] for f in item.get('foods', [])]) # "Phở, Chuối"
+                "foodCount": len(foods),
+                "foodNames": ", ".join([f.get('FoodName', 'Món ăn') for f in foods]) # "Phở, Chuối"
             })
 
         # 4. Chuyển Map thành List và Sắp xếp (Mới nhất lên đầu)
+        # 1 ngày có thể bị chia ở ranh giới 2 trang -> frontend gộp theo 'date'
         final_list = list(history_map.values())
         final_list.sort(key=lambda x: x['date'], reverse=True)
 
-        return resp(200, final_list)
+        return resp(200, {
+            "days": final_list,
+            "nextCursor": encode_cursor(last_key) if last_key else None
+        }, etag)
 
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -69,9 +146,20 @@ class DecimalEncoder(json.JSONEncoder):
         if isinstance(obj, Decimal): return float(obj)
         return super(DecimalEncoder, self).default(obj)
 
-def resp(code, body):
+def resp(code, body, etag=None):
+    headers = {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"}
+    if etag:
+        # no-cache: trình duyệt giữ bản cũ nhưng lần nào cũng hỏi lại bằng If-None-Match
+        headers.update({"ETag": etag, "Cache-Control": "no-cache", "Access-Control-Expose-Headers": "ETag"})
     return {
         "statusCode": code,
-        "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
+        "headers": headers,
         "body": json.dumps(body, cls=DecimalEncoder, ensure_ascii=False)
+    }
+
+def not_modified(etag):
+    return {
+        "statusCode": 304,
+        "headers": {"Access-Control-Allow-Origin": "*", "ETag": etag, "Cache-Control": "no-cache"},
+        "body": ""
     }
\ No newline at end of file
@@ -1,23 +1,144 @@
 import json
 import boto3
+import hashlib
 import os
+import threading
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from decimal import Decimal
 from boto3.dynamodb.conditions import Key
 
+import trends
+from foods import get_food_index, get_food_index_version, hydrate_food
+
 dynamodb = boto3.resource('dynamodb')
 TABLE_USERS = dynamodb.Table(os.environ.get('USER_TABLE', 'FoodMind-Users'))
 TABLE_LOGS = dynamodb.Table(os.environ.get('LOGS_TABLE', 'FoodMind-MealLogs'))
 TABLE_HISTORY = dynamodb.Table(os.environ.get('HISTORY_TABLE', 'FoodMind-Update-Tdee'))
+TABLE_STATS = dynamodb.Table(os.environ.get('STATS_TABLE', 'FoodMind-UserStats'))
+
+# Tóm tắt ngày do log_meal ghi (DAY#<ngày>): breakfast / lunch / dinner, logCount, lastLoggedAt (tổng = cộng các bữa)
+DAY_PREFIX = 'DAY#'
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner')
+RECENT_LIMIT = 3
+# Bộ đếm số lần ghi log (item VERSION do log_meal tăng) -> dùng cho ETag
+VERSION_KEY = 'VERSION'
+# Tổng hợp tháng / năm do log_meal cộng dồn: total, breakfast / lunch / dinner, days, over, under
+MONTH_PREFIX = 'MONTH#'
+YEAR_PREFIX = 'YEAR#'
+# Số ngày của biểu đồ (?range=...), mặc định 7
+CHART_RANGES = (7, 30, 90, 365)
+
+# Các lượt đọc DynamoDB độc lập chạy song song -> độ trễ ~ lượt chậm nhất thay vì tổng.
+# Pool tạo 1 lần / container, tái dùng giữa các lần gọi.
+READ_POOL = ThreadPoolExecutor(max_workers=5)
+# boto3 resource / Table không thread-safe -> mỗi thread dùng Session + resource riêng (tạo 1 lần / thread)
+_thread_local = threading.local()
+
+def worker_table(table):
+    tables = getattr(_thread_local, 'tables', None)
+    if tables is None:
+        _thread_local.dynamodb = boto3.session.Session().resource('dynamodb')
+        tables = _thread_local.tables = {}
+    if table.name not in tables:
+        tables[table.name] = _thread_local.dynamodb.Table(table.name)
+    return tables[table.name]
+
+# Chỉ lấy thuộc tính dashboard dùng (dùng #placeholder vì 'total', 'name'... là từ khoá của DynamoDB)
+def projection(*attrs):
+    names = {f'#p{n}': a for n, a in enumerate(attrs)}
+    return {'ProjectionExpression': ', '.join(names), 'ExpressionAttributeNames': names}
+
+USER_FIELDS = projection('tdee', 'goal', 'updatedAt')
+VERSION_FIELDS = projection('logs')
+TDEE_FIELDS = projection('updatedAt', 'tdee')
+DAY_FIELDS = projection('statKey', *MEAL_TYPES)
+# Log gần đây vẫn cần 'foods' để hiện tên món đầu + số món còn lại, nhưng chỉ đọc vài item
+RECENT_FIELDS = projection('mealType', 'foods', 'totalCalories', 'loggedAt', 'dateShort')
 
 def get_vietnam_time():
     return datetime.utcnow() + timedelta(hours=7)
 
-def get_tdee_for_date(target_date_str, history_items, current_tdee):
-    valid_updates = [item for item in history_items if item.get('updatedAt', '')[:10] <= target_date_str]
-    if not valid_updates: return current_tdee
-    latest = sorted(valid_updates, key=lambda x: x.get('updatedAt', ''))[-1]
-    return float(latest.get('tdee', current_tdee))
+def query_all(table, **kwargs):
+    # Đọc hết các trang (LastEvaluatedKey) của 1 query
+    items = []
+    while True:
+        res = table.query(**kwargs)
+        items.extend(res.get('Items', []))
+        if 'LastEvaluatedKey' not in res: return items
+        kwargs['ExclusiveStartKey'] = res['LastEvaluatedKey']
+
+def get_user(user_id):
+    return worker_table(TABLE_USERS).get_item(Key={'sub': user_id}, **USER_FIELDS).get('Item')
+
+def get_log_version(user_id):
+    item = worker_table(TABLE_STATS).get_item(
+        Key={'sub': user_id, 'statKey': VERSION_KEY}, **VERSION_FIELDS).get('Item')
+    return (item or {}).get('logs', 0)
+
+def get_dashboard_etag(user, log_version, catalog_version, today, days):
+    # Dashboard chỉ đổi khi: sửa hồ sơ (updatedAt, kèm lịch sử TDEE), log thêm bữa, đổi catalog (tên món),
+    # sang ngày mới, qua mốc giờ của lời khuyên (17h, 20h) hoặc đổi range
+    hour_bucket = 0 if today.hour < 17 else 1 if today.hour < 20 else 2
+    raw = (f"{user.get('updatedAt', '')}|{log_version}|{catalog_version}|"
+           f"{today.strftime('%Y-%m-%d')}|{hour_bucket}|{days}")
+    return '"' + hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20] + '"'
+
+def get_if_none_match(event):
+    headers = event.get('headers') or {}
+    value = headers.get('if-none-match') or headers.get('If-None-Match') or ''
+    return [v.strip().removeprefix('W/') for v in value.split(',') if v.strip()]
+
+def get_tdee_baseline(user_id, start_str):
+    # Lần cập nhật gần nhất trước khoảng cần vẽ (TDEE đầu khoảng)
+    return worker_table(TABLE_HISTORY).query(
+        KeyConditionExpression=Key('sub').eq(user_id) & Key('updatedAt').lt(start_str),
+        ScanIndexForward=False,
+        Limit=1,
+        **TDEE_FIELDS
+    ).get('Items', [])
+
+def get_tdee_window(user_id, start_str):
+    # Chỉ đọc các lần cập nhật trong khoảng cần vẽ
+    return query_all(worker_table(TABLE_HISTORY),
+                     KeyConditionExpression=Key('sub').eq(user_id) & Key('updatedAt').gte(start_str),
+                     **TDEE_FIELDS)
+
+def build_tdee_timeline(history_items):
+    # Sắp 1 lần theo updatedAt -> (ngày, tdee); tra từng ngày bằng bisect
+    ordered = sorted(history_items, key=lambda x: x.get('updatedAt', ''))
+    return [x.get('updatedAt', '')[:10] for x in ordered], [x.get('tdee') for x in ordered]
+
+def get_tdee_for_date(target_date_str, timeline, current_tdee):
+    # TDEE của lần cập nhật cuối cùng trong hoặc trước ngày target
+    dates, tdees = timeline
+    idx = bisect_right(dates, target_date_str) - 1
+    if idx < 0: return current_tdee
+    return float(tdees[idx] if tdees[idx] is not None else current_tdee)
+
+def day_total(day_item):
+    # Tổng ngày không lưu trên item (log_meal ghi DAY# bằng 1 lệnh) -> cộng calo các bữa
+    return sum(float(day_item.get(m, 0)) for m in MEAL_TYPES)
+
+def get_day_summaries(user_id, start_str, end_str):
+    # 1 query nhỏ trên bảng UserStats thay vì đọc mọi log (kèm danh sách món) rồi cộng lại
+    items = query_all(worker_table(TABLE_STATS),
+                      KeyConditionExpression=Key('sub').eq(user_id) &
+                          Key('statKey').between(f'{DAY_PREFIX}{start_str}', f'{DAY_PREFIX}{end_str}'),
+                      **DAY_FIELDS)
+    return {item['statKey'][len(DAY_PREFIX):]: item for item in items}
+
+def get_recent_logs(user_id, start_str):
+    # dateMeal = '<ngày>#<bữa>' và ngày chính là ngày log -> đọc ngược vài item mới nhất là đủ
+    res = worker_table(TABLE_LOGS).query(
+        KeyConditionExpression=Key('sub').eq(user_id) & Key('dateMeal').gte(start_str),
+        ScanIndexForward=False,
+        Limit=RECENT_LIMIT * len(MEAL_TYPES),
+        **RECENT_FIELDS
+    )
+    logs = res.get('Items', [])
+    return sorted(logs, key=lambda x: int(x.get('loggedAt', 0)), reverse=True)[:RECENT_LIMIT]
 
 # 👇 HÀM LOGIC LỜI KHUYÊN MỚI (THEO YÊU CẦU)
 def generate_smart_insight(current_hour, breakfast_cal, lunch_cal, total_today, tdee, goal):
@@ -49,48 +170,134 @@ def generate_smart_insight(current_hour, breakfast_cal, lunch_cal, total_today,
         if goal == 'gain': return {"type": "info", "text": "Đừng quên ăn đủ bữa để đạt mục tiêu tăng cân nhé."}
         return {"type": "info", "text": "Chúc bạn một ngày tràn đầy năng lượng!"}
 
+def format_rollup(item, prefix):
+    days = int(item.get('days', 0))
+    total = float(item.get('total', 0))
+    meals = {m: float(item.get(m, 0)) for m in MEAL_TYPES}
+    return {
+        "period": item['statKey'][len(prefix):],
+        "totalCalories": int(total),
+        "daysLogged": days,
+        "avgDailyCalories": int(total / days) if days else 0,
+        "mealSplit": {m: round(cal * 100 / total) if total > 0 else 0 for m, cal in meals.items()},
+        "daysOver": int(item.get('over', 0)),
+        "daysUnder": int(item.get('under', 0))
+    }
+
+def handle_summary(user_id, params):
+    # GET /dashboard/summary?period=month&year=2025 (12 item tháng) | period=year (mọi năm)
+    period = params.get('period', 'month')
+    if period == 'month':
+        year = params.get('year') or get_vietnam_time().strftime('%Y')
+        if not (len(year) == 4 and year.isdigit()): return resp(400, {"error": "Invalid year"})
+        prefix, cond = MONTH_PREFIX, Key('statKey').between(f'{MONTH_PREFIX}{year}-01', f'{MONTH_PREFIX}{year}-12')
+    elif period == 'year':
+        prefix, cond = YEAR_PREFIX, Key('statKey').begins_with(YEAR_PREFIX)
+    else:
+        return resp(400, {"error": "period must be month or year"})
+
+    items = query_all(TABLE_STATS, KeyConditionExpression=Key('sub').eq(user_id) & cond)
+    return resp(200, {"period": period, "items": [format_rollup(i, prefix) for i in items]})
+
+def handle_trends(user_id, params):
+    # GET /dashboard/trends?range=30: MA7 / MA30 so với TDEE, chuỗi ngày log, % ngày đạt ±10%
+    try:
+        days = int(params.get('range', 30))
+    except ValueError:
+        days = None
+    if days not in CHART_RANGES: return resp(400, {"error": "Invalid range"})
+
+    today = get_vietnam_time()
+    total_days = days + max(trends.MA_WINDOWS) - 1   # thêm ngày đệm để MA30 ngày đầu đủ dữ liệu
+    start_str = (today - timedelta(days=total_days - 1)).strftime('%Y-%m-%d')
+    today_str = today.strftime('%Y-%m-%d')
+
+    user_f = READ_POOL.submit(get_user, user_id)
+    baseline_f = READ_POOL.submit(get_tdee_baseline, user_id, start_str)
+    window_f = READ_POOL.submit(get_tdee_window, user_id, start_str)
+    days_f = READ_POOL.submit(get_day_summaries, user_id, start_str, today_str)
+
+    user = user_f.result()
+    if not user: return resp(404, {"error": "User not found"})
+    current_tdee = float(user.get('tdee', 2000))
+    timeline = build_tdee_timeline(baseline_f.result() + window_f.result())
+    day_items = days_f.result()
+
+    dates, intakes, targets, logged = [], [], [], []
+    for i in range(total_days - 1, -1, -1):
+        d_str = (today - timedelta(days=i)).strftime('%Y-%m-%d')
+        item = day_items.get(d_str)
+        dates.append(d_str)
+        intakes.append(day_total(item) if item else 0.0)
+        targets.append(get_tdee_for_date(d_str, timeline, current_tdee))
+        logged.append(1.0 if item and day_total(item) > 0 else 0.0)
+
+    return resp(200, {"range": days, **trends.compute_trends(dates, intakes, targets, logged, days)})
+
 def lambda_handler(event, context):
-    user_id = event.get('queryStringParameters', {}).get('userId')
+    params = event.get('queryStringParameters') or {}
+    user_id = params.get('userId')
     if not user_id: return resp(400, {"error": "Missing userId"})
 
+    route = event.get('routeKey')
+    if route in ("GET /dashboard/summary", "GET /dashboard/trends"):
+        try:
+            if route == "GET /dashboard/summary": return handle_summary(user_id, params)
+            return handle_trends(user_id, params)
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            return resp(500, {"error": str(e)})
+
     try:
-        user_res = TABLE_USERS.get_item(Key={'sub': user_id})
-        user = user_res.get('Item')
+        days = int(params.get('range', CHART_RANGES[0]))
+    except ValueError:
+        days = None
+    if days not in CHART_RANGES: return resp(400, {"error": "Invalid range"})
+
+    try:
+        today = get_vietnam_time()
+        start_date = (today - timedelta(days=7)).strftime('%Y-%m-%d')
+        chart_start = (today - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        today_str = today.strftime('%Y-%m-%d')
+
+        # 1. Đọc song song: user + version + catalog món (đủ để tính ETag), TDEE đầu khoảng,
+        #    TDEE trong khoảng, tóm tắt ngày, log gần đây.
+        #    Có If-None-Match thì đọc 3 lượt đầu trước, khớp ETag -> 304 luôn
+        def submit_reads():
+            return (READ_POOL.submit(get_tdee_baseline, user_id, chart_start),
+                    READ_POOL.submit(get_tdee_window, user_id, chart_start),
+                    READ_POOL.submit(get_day_summaries, user_id, chart_start, today_str),
+                    READ_POOL.submit(get_recent_logs, user_id, start_date))
+
+        known_etags = get_if_none_match(event)
+        user_f = READ_POOL.submit(get_user, user_id)
+        version_f = READ_POOL.submit(get_log_version, user_id)
+        catalog_f = READ_POOL.submit(get_food_index)
+        reads = None if known_etags else submit_reads()
+
+        user = user_f.result()
         if not user: return resp(404, {"error": "User not found"})
+
+        catalog = catalog_f.result()
+        etag = get_dashboard_etag(user, version_f.result(), get_food_index_version(), today, days)
+        if etag in known_etags: return not_modified(etag)
+        baseline_f, window_f, days_f, recent_f = reads or submit_reads()
         
         current_tdee = float(user.get('tdee', 2000))
         goal = user.get('goal', 'maintain')
 
-        hist_res = TABLE_HISTORY.query(KeyConditionExpression=Key('sub').eq(user_id))
-        history_items = hist_res.get('Items', [])
-
-        today = get_vietnam_time()
-        start_date = (today - timedelta(days=7)).strftime('%Y-%m-%d')
-        
-        logs_res = TABLE_LOGS.query(
-            KeyConditionExpression=Key('sub').eq(user_id) & Key('dateMeal').gte(start_date)
-        )
-        logs = logs_res.get('Items', [])
+        timeline = build_tdee_timeline(baseline_f.result() + window_f.result())
+        day_items = days_f.result()
 
-        # XỬ LÝ DỮ LIỆU
+        # XỬ LÝ DỮ LIỆU: O(số ngày + số lần cập nhật TDEE)
         chart_data = []
-        today_str = today.strftime('%Y-%m-%d')
-        today_calories = 0
-        
-        # Biến đếm Calo từng bữa cho ngày hôm nay
-        today_break = 0
-        today_lunch = 0
-        today_dinner = 0
-
-        for i in range(6, -1, -1):
+        for i in range(days - 1, -1, -1):
             d_date = today - timedelta(days=i)
             d_str = d_date.strftime('%Y-%m-%d')
-            d_label = d_date.strftime('%d/%m')
+            d_label = d_date.strftime('%d/%m' if days <= 90 else '%d/%m/%y')
 
-            # Lấy log của ngày d_str
-            daily_logs = [l for l in logs if l.get('dateShort') == d_str]
-            daily_eat = sum(float(l['totalCalories']) for l in daily_logs)
-            daily_target = get_tdee_for_date(d_str, history_items, current_tdee)
+            daily_eat = day_total(day_items.get(d_str, {}))
+            daily_target = get_tdee_for_date(d_str, timeline, current_tdee)
 
             chart_data.append({
                 "date": d_label,
@@ -98,26 +305,24 @@ def lambda_handler(event, context):
                 "targetTdee": int(daily_target)
             })
 
-            if d_str == today_str:
-                today_calories = int(daily_eat)
-                # Phân loại calo theo bữa (cho biểu đồ tròn & logic lời khuyên)
-                for l in daily_logs:
-                    meal = l.get('mealType')
-                    cal = float(l.get('totalCalories', 0))
-                    if meal == 'breakfast': today_break += cal
-                    elif meal == 'lunch': today_lunch += cal
-                    elif meal == 'dinner': today_dinner += cal
+        # Calo từng bữa hôm nay (cho biểu đồ tròn & logic lời khuyên)
+        today_item = day_items.get(today_str, {})
+        today_calories = int(day_total(today_item))
+        today_break = float(today_item.get('breakfast', 0))
+        today_lunch = float(today_item.get('lunch', 0))
+        today_dinner = float(today_item.get('dinner', 0))
 
         # Lời khuyên thông minh
         insight = generate_smart_insight(today.hour, today_break, today_lunch, today_calories, current_tdee, goal)
 
         # Recent logs
-        sorted_logs = sorted(logs, key=lambda x: int(x.get('loggedAt', 0)), reverse=True)[:3] # Lấy 3 cái
+        sorted_logs = recent_f.result() # Lấy 3 cái
         recent_activities = []
         for l in sorted_logs:
             foods = l.get('foods', [])
             if not foods: continue
-            first_food = foods[0].get('FoodName', 'Món ăn')
+            # Log mới chỉ lưu FoodID -> tên món lấy từ catalog (cache trong bộ nhớ)
+            first_food = hydrate_food(foods[0], catalog).get('FoodName') or 'Món ăn'
             count = len(foods) - 1
             name = f"{first_food}" + (f" + {count} món" if count > 0 else "")
             
@@ -143,11 +348,12 @@ def lambda_handler(event, context):
                 {"name": "Tối", "value": int(today_dinner)},
             ],
             "insight": insight, # Object {type, text}
-            "weeklyChart": chart_data,
+            "weeklyChart": chart_data, # Giữ tên cũ cho frontend; độ dài = range
+            "range": days,
             "recentActivities": recent_activities
         }
 
-        return resp(200, dashboard_data)
+        return resp(200, dashboard_data, etag)
 
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -158,9 +364,20 @@ class DecimalEncoder(json.JSONEncoder):
         if isinstance(obj, Decimal): return float(obj)
         return super(DecimalEncoder, self).default(obj)
 
-def resp(code, body):
+def resp(code, body, etag=None):
+    headers = {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"}
+    if etag:
+        # no-cache: trình duyệt giữ bản cũ nhưng lần nào cũng hỏi lại bằng If-None-Match
+        headers.update({"ETag": etag, "Cache-Control": "no-cache", "Access-Control-Expose-Headers": "ETag"})
     return {
         "statusCode": code,
-        "headers": {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"},
+        "headers": headers,
         "body": json.dumps(body, cls=DecimalEncoder, ensure_ascii=False)
+    }
+
+def not_modified(etag):
+    return {
+        "statusCode": 304,
+        "headers": {"Access-Control-Allow-Origin": "*", "ETag": etag, "Cache-Control": "no-cache"},
+        "body": ""
     }
\ No newline at end of file
@@ -0,0 +1,76 @@
+from array import array
+from itertools import accumulate
+
+# ============================================================
+# PHÂN TÍCH XU HƯỚNG trên chuỗi tổng calo theo ngày (item DAY#, không đọc log gốc)
+# Mọi phép tính là O(số ngày): trung bình trượt bằng tổng tiền tố, không lặp lại cửa sổ.
+# ============================================================
+
+MA_WINDOWS = (7, 30)
+ADHERENCE_BAND = 0.1   # Ngày "đạt" = ăn trong khoảng ±10% TDEE của ngày đó
+
+def prefix_sums(values):
+    return array('d', accumulate(values, initial=0.0))
+
+def moving_average(intakes, logged, window):
+    # Trung bình trượt trên các ngày CÓ log trong cửa sổ (ngày không log không tính là 0 calo)
+    sums = prefix_sums(intakes)
+    counts = prefix_sums(logged)
+    result = []
+    for i in range(len(intakes)):
+        lo = max(0, i + 1 - window)
+        n = counts[i + 1] - counts[lo]
+        result.append((sums[i + 1] - sums[lo]) / n if n else None)
+    return result
+
+def current_streak(logged):
+    # Số ngày log liên tiếp tính đến hôm nay; hôm nay chưa log thì tính đến hôm qua
+    end = len(logged)
+    if end and not logged[-1]: end -= 1
+    streak = 0
+    while streak < end and logged[end - 1 - streak]:
+        streak += 1
+    return streak
+
+def adherence(intakes, targets, logged):
+    days = [i for i in range(len(intakes)) if logged[i]]
+    if not days: return 0.0
+    within = sum(1 for i in days if abs(intakes[i] - targets[i]) <= ADHERENCE_BAND * targets[i])
+    return within / len(days)
+
+def trend_insight(ma7, target, streak):
+    if ma7 is None:
+        return {"type": "info", "text": "Hãy ghi nhật ký vài ngày để xem xu hướng ăn uống của bạn."}
+    if ma7 > target * (1 + ADHERENCE_BAND):
+        return {"type": "warning", "text": "Trung bình 7 ngày qua bạn đang ăn vượt mục tiêu. Hãy giảm bớt khẩu phần nhé!"}
+    if ma7 < target * (1 - ADHERENCE_BAND):
+        return {"type": "alert", "text": "Trung bình 7 ngày qua bạn ăn thấp hơn mục tiêu khá nhiều. Đừng bỏ bữa nhé!"}
+    if streak >= 7:
+        return {"type": "success", "text": f"Tuyệt vời! Bạn đã ghi nhật ký {streak} ngày liên tiếp và ăn đúng mục tiêu."}
+    return {"type": "success", "text": "Lượng ăn trung bình 7 ngày qua đang bám sát mục tiêu."}
+
+def compute_trends(dates, intakes, targets, logged, shown):
+    # dates / intakes / targets / logged: cả chuỗi (gồm 29 ngày đệm trước để MA30 đủ dữ liệu), phần tử cuối là hôm nay;
+    # shown: số ngày cuối cùng trả về
+    averages = {w: moving_average(intakes, logged, w) for w in MA_WINDOWS}
+    start = len(dates) - shown
+    series = []
+    for i in range(start, len(dates)):
+        series.append({
+            "date": dates[i],
+            "caloriesIn": int(intakes[i]) if logged[i] else None,
+            "targetTdee": int(targets[i]),
+            **{f"ma{w}": int(averages[w][i]) if averages[w][i] is not None else None for w in MA_WINDOWS}
+        })
+
+    # Hôm nay chưa ăn hết các bữa -> tỉ lệ đạt mục tiêu và nhận xét chỉ tính các ngày đã qua
+    done = len(dates) - 1
+    ma7 = averages[7][done - 1] if done > 0 else None
+    streak = current_streak(logged)
+    return {
+        "series": series,
+        "streak": streak,
+        "adherence": round(adherence(intakes[start:done], targets[start:done], logged[start:done]) * 100, 1),
+        "daysLogged": int(sum(logged[start:])),
+        "insight": trend_insight(int(ma7) if ma7 is not None else None, targets[done - 1] if done > 0 else 0, streak)
+    }
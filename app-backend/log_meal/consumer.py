@@ -0,0 +1,81 @@
+import os
+import time
+
+import main
+from log_queue import decode, get_queue
+
+# ============================================================
+# CONSUMER CỦA HÀNG ĐỢI GHI LOG (chế độ buffer, xem log_queue.py)
+# Mỗi lượt: gom message -> bỏ log bị ghi đè trong cùng lượt (cùng sub + dateMeal, giữ log gửi sau)
+# -> BatchWriteItem 25 item / lệnh, thử lại UnprocessedItems -> cập nhật tổng hợp 1 lần / user.
+# Giờ cao điểm 1 lượt thay cho hàng trăm lần ghi lẻ; log_meal chỉ còn 1 lần gửi message.
+# Thứ tự: hàng đợi FIFO theo user (MessageGroupId = sub) -> message của 1 user tới đúng thứ tự gửi
+# và không có 2 lượt xử lý cùng user song song, nên log / DAY# ghi sau luôn là mới nhất.
+# Giao lại (lỗi giữa chừng): ghi log, DAY#, tháng / năm, món gần đây đều ra cùng kết quả khi chạy lại;
+# riêng PREFS là ADD -> chỉ cộng message có seq lớn hơn seq đã lưu trên PREFS.
+# ============================================================
+
+BATCH_WRITE_SIZE = 25     # Giới hạn của BatchWriteItem
+MAX_RETRIES = 8           # Số lần thử lại UnprocessedItems (backoff 50ms, 100ms, ... tối đa ~2.5s)
+DRAIN_BATCH = int(os.environ.get('LOG_DRAIN_BATCH', '500'))  # Số message / lượt khi tự drain (local)
+
+def coalesce(messages):
+    # -> (item cuối cùng của từng (sub, dateMeal), {sub: {'items', 'messages'}})
+    latest, users = {}, {}
+    for msg in messages:
+        user = users.setdefault(msg['sub'], {'items': [], 'messages': []})
+        user['messages'].append(msg)
+        for item in msg['items']:
+            # Message của cùng user tới theo thứ tự gửi -> message sau thắng
+            latest[(item['sub'], item['dateMeal'])] = item
+            user['items'].append(item)
+    return list(latest.values()), users
+
+def batch_write(items):
+    # BatchWriteItem không cho 2 item trùng key trong 1 lệnh -> items phải đã qua coalesce
+    table = main.TABLE_LOGS.name
+    for start in range(0, len(items), BATCH_WRITE_SIZE):
+        pending = {table: [{'PutRequest': {'Item': item}} for item in items[start:start + BATCH_WRITE_SIZE]]}
+        for attempt in range(MAX_RETRIES + 1):
+            res = main.dynamodb.batch_write_item(RequestItems=pending)
+            pending = res.get('UnprocessedItems') or {}
+            if not pending: break
+            if attempt == MAX_RETRIES:
+                # Ném lỗi -> cả lượt được giao lại; ghi log là put (ghi lại không sao), tổng hợp chưa chạy
+                raise RuntimeError(f"Còn {sum(len(v) for v in pending.values())} log chưa ghi được")
+            time.sleep(min(0.05 * 2 ** attempt, 2.5))
+
+def process(messages):
+    if not messages: return 0
+    items, users = coalesce(messages)
+
+    # 1. Ghi log trước (idempotent), 2. rồi mới cập nhật tổng hợp
+    batch_write(items)
+    for sub, user in users.items():
+        # Message đã cộng vào PREFS ở lượt trước (bị giao lại) -> không cộng lại, cũng không tính vào VERSION
+        applied = main.get_applied_seq(sub)
+        fresh = [msg for msg in user['messages'] if int(msg['seq']) > applied]
+        seq = (applied, max(int(msg['seq']) for msg in fresh)) if fresh else None
+        main.update_aggregates(sub, user['items'], len(fresh),
+                               [item for msg in fresh for item in msg['items']], seq)
+    return len(messages)
+
+def drain(queue=None, batch_size=DRAIN_BATCH):
+    # Dùng cho hàng đợi memory / file (local, mô phỏng): xử lý đến khi hàng đợi rỗng
+    queue = queue or get_queue()
+    total = 0
+    while True:
+        batch = queue.receive(batch_size)
+        if not batch: return total
+        # process() lỗi -> không ack, message được giao lại sau VISIBILITY_TIMEOUT
+        total += process([message for _, message in batch])
+        queue.ack([handle for handle, _ in batch])
+
+def lambda_handler(event, context):
+    # SQS event source: event['Records'][i]['body']; gọi tay / theo lịch (không có Records) -> tự drain
+    records = event.get('Records')
+    if records is None:
+        return {"processed": drain()}
+    # SequenceNumber của FIFO tăng dần theo từng message group (= user)
+    return {"processed": process([{**decode(r['body']), 'seq': int(r['attributes']['SequenceNumber'])}
+                                  for r in records])}
@@ -0,0 +1,146 @@
+import boto3
+import json
+import os
+import time
+import uuid
+from collections import deque
+from decimal import Decimal
+
+# ============================================================
+# HÀNG ĐỢI GHI LOG (chế độ buffer giờ cao điểm)
+# log_meal chỉ đẩy 1 message / request rồi trả 202; consumer.py gom nhiều message ghi 1 lượt.
+# LOG_QUEUE chọn nơi chứa message:
+#   'sync' / trống -> tắt buffer, ghi thẳng DynamoDB như cũ
+#   'sqs'          -> SQS FIFO (LOG_QUEUE_URL), consumer chạy bằng event source của Lambda
+#   'memory'       -> deque trong process (mô phỏng / test)
+#   'file'         -> thư mục LOG_QUEUE_DIR, mỗi message 1 file JSON (chạy local, ghi từ nhiều process)
+# Mỗi message có 'seq' tăng dần theo user (SQS: SequenceNumber; memory / file: time_ns lúc gửi)
+# -> consumer bỏ qua phần đã cộng vào PREFS khi message bị giao lại.
+# ============================================================
+
+def encode(message):
+    # Decimal -> số JSON; khi đọc lại parse_float=Decimal nên DynamoDB nhận đúng kiểu
+    return json.dumps(message, default=lambda o: float(o) if isinstance(o, Decimal) else str(o),
+                      ensure_ascii=False)
+
+def decode(body):
+    return json.loads(body, parse_float=Decimal)
+
+# Message đã nhận nhưng chưa ack sẽ được giao lại sau VISIBILITY_TIMEOUT giây (giống SQS)
+# -> consumer lỗi giữa chừng thì không mất log
+VISIBILITY_TIMEOUT = int(os.environ.get('LOG_QUEUE_VISIBILITY', '360'))
+
+# receive() trả về [(handle, message)]; chỉ ack(handles) sau khi consumer xử lý xong cả lượt
+class SqsQueue:
+    def __init__(self, url):
+        self.url = url
+        self.sqs = boto3.client('sqs')
+
+    def send(self, message):
+        # 1 group / user: thứ tự giữ nguyên trong group, các user khác nhau vẫn xử lý song song
+        self.sqs.send_message(QueueUrl=self.url, MessageBody=encode(message),
+                              MessageGroupId=message['sub'], MessageDeduplicationId=uuid.uuid4().hex)
+
+    def receive(self, max_messages):
+        # Trên Lambda message tới qua event['Records']; hàm này chỉ dùng khi tự drain (vd. script)
+        res = self.sqs.receive_message(QueueUrl=self.url, MaxNumberOfMessages=min(max_messages, 10),
+                                       VisibilityTimeout=VISIBILITY_TIMEOUT,
+                                       AttributeNames=['SequenceNumber'])
+        return [(m['ReceiptHandle'], {**decode(m['Body']), 'seq': int(m['Attributes']['SequenceNumber'])})
+                for m in res.get('Messages', [])]
+
+    def ack(self, handles):
+        for start in range(0, len(handles), 10):
+            self.sqs.delete_message_batch(QueueUrl=self.url, Entries=[
+                {'Id': str(n), 'ReceiptHandle': h} for n, h in enumerate(handles[start:start + 10])])
+
+class MemoryQueue:
+    def __init__(self):
+        self.messages = deque()
+        self.in_flight = {}  # handle -> (hạn giao lại, body)
+
+    def send(self, message):
+        self.messages.append(encode({**message, 'seq': time.time_ns()}))
+
+    def receive(self, max_messages):
+        now = time.monotonic()
+        for handle, (deadline, body) in list(self.in_flight.items()):
+            if deadline <= now:
+                del self.in_flight[handle]
+                self.messages.appendleft(body)
+        batch = []
+        while self.messages and len(batch) < max_messages:
+            body = self.messages.popleft()
+            handle = uuid.uuid4().hex
+            self.in_flight[handle] = (now + VISIBILITY_TIMEOUT, body)
+            batch.append((handle, decode(body)))
+        return batch
+
+    def ack(self, handles):
+        for handle in handles:
+            self.in_flight.pop(handle, None)
+
+class FileQueue:
+    # Ghi file tạm rồi rename (nguyên tử); consumer "nhận" message bằng rename sang .claimed
+    # -> nhiều consumer cùng thư mục không xử lý trùng. File .claimed quá VISIBILITY_TIMEOUT
+    # (consumer chết / lỗi) được nhận lại; ack mới xoá file.
+    # Không khoá theo user như FIFO -> chỉ chạy 1 consumer / thư mục để giữ thứ tự log
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def send(self, message):
+        seq = time.time_ns()
+        name = f"{seq:020d}-{uuid.uuid4().hex}"
+        tmp = os.path.join(self.path, name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(encode({**message, 'seq': seq}))
+        os.rename(tmp, os.path.join(self.path, name + '.json'))
+
+    def receive(self, max_messages):
+        batch = []
+        now = time.time()
+        for name in sorted(os.listdir(self.path)):
+            if len(batch) >= max_messages: break
+            src = os.path.join(self.path, name)
+            if name.endswith('.claimed'):
+                try:
+                    if now - os.path.getmtime(src) < VISIBILITY_TIMEOUT: continue
+                except FileNotFoundError:
+                    continue
+            elif not name.endswith('.json'):
+                continue
+            # Tên claim mới mỗi lần nhận -> 2 consumer cùng nhận lại 1 file hết hạn thì chỉ 1 bên thắng
+            claimed = os.path.join(self.path, f"{name.split('.')[0]}.{uuid.uuid4().hex[:8]}.claimed")
+            try:
+                os.rename(src, claimed)
+            except FileNotFoundError:
+                continue  # consumer khác đã lấy
+            os.utime(claimed)  # mốc tính VISIBILITY_TIMEOUT
+            with open(claimed, encoding='utf-8') as f:
+                batch.append((claimed, decode(f.read())))
+        return batch
+
+    def ack(self, handles):
+        for claimed in handles:
+            try:
+                os.remove(claimed)
+            except FileNotFoundError:
+                pass
+
+_queue = {"mode": None, "queue": None}
+
+def get_queue():
+    # None = chế độ ghi đồng bộ. Tạo 1 lần / container
+    mode = os.environ.get('LOG_QUEUE', 'sync').lower()
+    if mode != _queue['mode']:
+        if mode == 'sqs':
+            _queue['queue'] = SqsQueue(os.environ['LOG_QUEUE_URL'])
+        elif mode == 'memory':
+            _queue['queue'] = MemoryQueue()
+        elif mode == 'file':
+            _queue['queue'] = FileQueue(os.environ.get('LOG_QUEUE_DIR', '/tmp/foodmind-log-queue'))
+        else:
+            _queue['queue'] = None
+        _queue['mode'] = mode
+    return _queue['queue']
@@ -4,14 +4,312 @@ import os
 import time
 from datetime import datetime, timedelta
 from decimal import Decimal
+from foods import get_food_index
+from log_queue import get_queue
 
 dynamodb = boto3.resource('dynamodb')
 TABLE_LOGS = dynamodb.Table(os.environ.get('LOGS_TABLE', 'FoodMind-MealLogs'))
+TABLE_STATS = dynamodb.Table(os.environ.get('STATS_TABLE', 'FoodMind-UserStats'))
+TABLE_USERS = dynamodb.Table(os.environ.get('USER_TABLE', 'FoodMind-Users'))
+
+# Bản ghi "món đã ăn gần đây": 1 item / user, mỗi món là 1 thuộc tính 'f#<FoodID>' = ngày ăn gần nhất
+RECENT_DISHES_KEY = 'RECENT_DISHES'
+# Calo theo ngày: item DAY#<ngày>, mỗi bữa 1 thuộc tính (breakfast / lunch / dinner); tổng ngày = cộng các bữa
+DAY_PREFIX = 'DAY#'
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner')
+# Bộ đếm số lần ghi log của user (item VERSION, thuộc tính 'logs') -> ETag của /dashboard, /history
+VERSION_KEY = 'VERSION'
+# Tổng hợp theo tháng / năm: MONTH#<YYYY-MM>, YEAR#<YYYY> (cộng dồn mỗi lần log, xem update_rollups)
+MONTH_PREFIX = 'MONTH#'
+YEAR_PREFIX = 'YEAR#'
+TDEE_BAND = Decimal('0.1')  # Ngày ăn lệch TDEE quá ±10% -> 'over' / 'under'
+
+# Sở thích theo user (item PREFS): 'f#<FoodID>' / 'g#<NutrientGroup>' cộng dồn trọng số "forward decay"
+# 2^((ngày - EPOCH) / HALF_LIFE) -> chỉ cần ADD atomic, bên đọc tự chia lại. Khớp với recommend/preferences.py
+PREFS_KEY = 'PREFS'
+PREF_EPOCH = datetime(2025, 1, 1)
+PREF_HALF_LIFE_DAYS = 30
+
+# Log lưu tham chiếu gọn: món trong catalog {FoodID, Portion, Calorie}; calo tính lại ở server từ catalog.
+# Món ngoài catalog (AI phân tích / nhập tay) không có FoodID -> giữ calo client gửi nhưng chặn biên.
+MAX_PORTION = Decimal('10')
+MAX_CUSTOM_CALORIE = Decimal('5000')
+MAX_NAME_LENGTH = 100
 
 # 👇 HÀM QUAN TRỌNG: ĐỒNG NHẤT GIỜ VN (UTC+7)
 def get_vietnam_time():
     return datetime.utcnow() + timedelta(hours=7)
 
+def update_recent_dishes(user_id, date_str, food_ids):
+    # SET thuộc tính cấp 1 nên không cần item tồn tại trước; kích thước bị chặn bởi số món trong catalog
+    if not food_ids: return
+    names, values, sets = {}, {':d': date_str}, []
+    for n, fid in enumerate(sorted(food_ids)):
+        names[f'#f{n}'] = f'f#{fid}'
+        sets.append(f'#f{n} = :d')
+    TABLE_STATS.update_item(
+        Key={'sub': user_id, 'statKey': RECENT_DISHES_KEY},
+        UpdateExpression='SET ' + ', '.join(sets),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+def clamp(value, low, high, default):
+    try:
+        value = Decimal(str(value))
+    except Exception:
+        return default
+    if not value.is_finite(): return default
+    return min(max(value, low), high)
+
+def find_unknown_foods(logs, foods):
+    # FoodID client gửi mà catalog không có -> từ chối, không lưu thành món 0 kcal
+    unknown = set()
+    for log in logs:
+        for f in log.get('foods', []):
+            if not isinstance(f, dict) or not f.get('FoodID'): continue
+            fid = f['FoodID']
+            if not isinstance(fid, str) or fid not in foods: unknown.add(str(fid))
+    return sorted(unknown)
+
+def compact_food(f, foods):
+    # Có FoodID -> món trong catalog (đã kiểm tra bằng find_unknown_foods); không có -> món tự nhập / AI
+    if f.get('FoodID'):
+        food = foods[f['FoodID']]
+        portion = clamp(f.get('Portion', 1), Decimal('0.1'), MAX_PORTION, Decimal('1'))
+        calorie = (Decimal(str(food.get('Calorie', 0))) * portion).quantize(Decimal('0.1'))
+        return {'FoodID': food['FoodID'], 'Portion': portion, 'Calorie': calorie}
+    return {
+        'FoodName': str(f.get('FoodName', ''))[:MAX_NAME_LENGTH],
+        'Calorie': clamp(f.get('Calorie', 0), Decimal('0'), MAX_CUSTOM_CALORIE, Decimal('0')).quantize(Decimal('0.1')),
+        'Unit': str(f.get('Unit', ''))[:MAX_NAME_LENGTH]
+    }
+
+def add_preference_weights(weights, date, foods, catalog):
+    # Cộng trọng số forward decay của 1 log (theo ngày của log) vào weights {thuộc tính PREFS: trọng số}
+    weight = 2.0 ** ((date - PREF_EPOCH).days / PREF_HALF_LIFE_DAYS)
+    for f in foods:
+        if f.get('FoodID'):
+            weights[f"f#{f['FoodID']}"] = weights.get(f"f#{f['FoodID']}", 0.0) + weight
+        group = ' '.join(str(catalog.get(f.get('FoodID'), f).get('NutrientGroup', '')).split())
+        if group:
+            weights[f'g#{group}'] = weights.get(f'g#{group}', 0.0) + weight
+    return weights
+
+def get_applied_seq(user_id):
+    # Số thứ tự message (hàng đợi) cuối cùng đã cộng vào PREFS; 0 = chưa có
+    item = TABLE_STATS.get_item(
+        Key={'sub': user_id, 'statKey': PREFS_KEY},
+        ProjectionExpression='#q',
+        ExpressionAttributeNames={'#q': 'seq'},
+        ConsistentRead=True
+    ).get('Item')
+    return int((item or {}).get('seq', 0))
+
+def update_preferences(user_id, weights, seq=None):
+    # seq = (seq đã áp dụng, seq mới) khi ghi từ hàng đợi: ADD có điều kiện trên seq đã áp dụng
+    # -> message bị giao lại không cộng trọng số lần 2
+    if not weights: return
+    names, values, parts = {}, {}, []
+    for n, (attr, weight) in enumerate(sorted(weights.items())):
+        names[f'#p{n}'] = attr
+        values[f':p{n}'] = Decimal(repr(weight))
+        parts.append(f'#p{n} :p{n}')
+    expr, kwargs = 'ADD ' + ', '.join(parts), {}
+    if seq:
+        applied, latest = seq
+        names['#q'] = 'seq'
+        values[':q'] = latest
+        expr = 'SET #q = :q ' + expr
+        if applied:
+            values[':q0'] = applied
+            kwargs['ConditionExpression'] = '#q = :q0'
+        else:
+            kwargs['ConditionExpression'] = 'attribute_not_exists(#q)'
+    TABLE_STATS.update_item(
+        Key={'sub': user_id, 'statKey': PREFS_KEY},
+        UpdateExpression=expr,
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+        **kwargs
+    )
+
+def update_daily_totals(user_id, date_str, meal_calories, timestamp, log_count=None):
+    # Item tóm tắt ngày (DAY#<ngày>): calo từng bữa, số lần log, lần log cuối -> 1 lần ghi duy nhất.
+    # Log cùng bữa trong ngày ghi đè log cũ (cùng dateMeal) nên calo bữa là SET, không cộng dồn;
+    # version tăng mỗi lần ghi -> /recommend biết plan đã lưu có còn đúng với calo đã ăn không.
+    # Không lưu tổng ngày (bên đọc cộng các bữa); 'total' của item cũ bị xoá để không lệch với các bữa.
+    meal_calories = {m: cal for m, cal in meal_calories.items() if m in MEAL_TYPES}
+    if not meal_calories: return
+    names = {'#u': 'updatedAt', '#l': 'lastLoggedAt', '#v': 'version', '#c': 'logCount', '#t': 'total'}
+    values = {':u': timestamp, ':one': 1, ':n': len(meal_calories) if log_count is None else log_count}
+    sets = ['#u = :u', '#l = :u']
+    for n, (meal, cal) in enumerate(meal_calories.items()):
+        names[f'#m{n}'] = meal
+        values[f':m{n}'] = cal
+        sets.append(f'#m{n} = :m{n}')
+    res = TABLE_STATS.update_item(
+        Key={'sub': user_id, 'statKey': f'{DAY_PREFIX}{date_str}'},
+        UpdateExpression='SET ' + ', '.join(sets) + ' REMOVE #t ADD #v :one, #c :n',
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+        ReturnValues='ALL_OLD'
+    )
+
+    # Item trước khi ghi + giá trị vừa SET -> phần chênh lệch từng bữa (cho tháng / năm) và tổng ngày mới
+    old = res.get('Attributes', {})
+    meal_deltas = {meal: Decimal(str(cal)) - Decimal(str(old.get(meal, 0))) for meal, cal in meal_calories.items()}
+    new_meals = {m: Decimal(str(meal_calories.get(m, old.get(m, 0)))) for m in MEAL_TYPES}
+    return {
+        'new_day': 'version' not in old,   # lần log đầu tiên của ngày
+        'meals': meal_deltas,
+        'total': sum(new_meals.values()),
+        'status': old.get('status')
+    }
+
+def get_tdee(user_id):
+    item = TABLE_USERS.get_item(
+        Key={'sub': user_id},
+        ProjectionExpression='#t',
+        ExpressionAttributeNames={'#t': 'tdee'}
+    ).get('Item')
+    return Decimal(str((item or {}).get('tdee', 2000)))
+
+def day_status(total, tdee):
+    if total > tdee * (1 + TDEE_BAND): return 'over'
+    if total < tdee * (1 - TDEE_BAND): return 'under'
+    return 'ok'
+
+def update_day_status(user_id, date_str, change, tdee):
+    # Trạng thái ngày (so với TDEE lúc log) lưu trên item DAY# để lần sau biết trạng thái cũ.
+    # Có điều kiện: 2 log cùng lúc chỉ 1 bên được đổi trạng thái -> bộ đếm tháng/năm không bị cộng 2 lần.
+    old_status, new_status = change['status'], day_status(change['total'], tdee)
+    if old_status == new_status: return old_status, new_status
+    names, values = {'#s': 'status'}, {':s': new_status}
+    if old_status:
+        condition = '#s = :old'
+        values[':old'] = old_status
+    else:
+        condition = 'attribute_not_exists(#s)'
+    try:
+        TABLE_STATS.update_item(
+            Key={'sub': user_id, 'statKey': f'{DAY_PREFIX}{date_str}'},
+            UpdateExpression='SET #s = :s',
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+    except Exception as e:
+        print(f"Bỏ qua đổi trạng thái ngày: {e}")
+        return old_status, old_status
+    return old_status, new_status
+
+def update_rollups(user_id, date_str, change, statuses):
+    # Cộng phần thay đổi của ngày vào item tháng + năm (chỉ ADD -> không cần đọc trước, ghi song song an toàn).
+    # Trung bình / ngày = total / days, tính khi đọc.
+    counters = {'total': sum(change['meals'].values())}
+    for meal, d in change['meals'].items():
+        counters[meal] = d
+    if change['new_day']:
+        counters['days'] = 1
+    old_status, new_status = statuses
+    if old_status != new_status:
+        if old_status in ('over', 'under'): counters[old_status] = counters.get(old_status, 0) - 1
+        if new_status in ('over', 'under'): counters[new_status] = counters.get(new_status, 0) + 1
+    counters = {k: v for k, v in counters.items() if v}
+    if not counters: return
+
+    names = {f'#c{n}': k for n, k in enumerate(counters)}
+    values = {f':c{n}': v for n, v in enumerate(counters.values())}
+    expr = 'ADD ' + ', '.join(f'#c{n} :c{n}' for n in range(len(counters)))
+    for stat_key in (f'{MONTH_PREFIX}{date_str[:7]}', f'{YEAR_PREFIX}{date_str[:4]}'):
+        TABLE_STATS.update_item(
+            Key={'sub': user_id, 'statKey': stat_key},
+            UpdateExpression=expr,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+
+def bump_log_version(user_id, count=1):
+    TABLE_STATS.update_item(
+        Key={'sub': user_id, 'statKey': VERSION_KEY},
+        UpdateExpression='ADD #l :n',
+        ExpressionAttributeNames={'#l': 'logs'},
+        ExpressionAttributeValues={':n': count}
+    )
+
+def build_log_items(user_id, logs, catalog, current_date, timestamp):
+    items = []
+    # Duyệt qua từng bữa (breakfast, lunch, dinner) được gửi lên
+    for log in logs:
+        meal_type = log.get('meal') 
+        foods = [compact_food(f, catalog) for f in log.get('foods', []) if isinstance(f, dict)]
+        
+        if not foods: continue
+
+        # Tính tổng calo của bữa đó (từ calo đã tính lại ở server, không tin client)
+        total_cal = sum(f['Calorie'] for f in foods)
+
+        items.append({
+            'sub': user_id,
+            'dateMeal': f"{current_date}#{meal_type}", # Key theo ngày VN
+            'dateShort': current_date,                 # Key theo ngày VN
+            'mealType': meal_type,
+            'loggedAt': timestamp,
+            'totalCalories': total_cal,
+            'foods': foods 
+        })
+    return items
+
+def update_aggregates(user_id, items, requests=1, prefs_items=None, seq=None):
+    # Cập nhật mọi bản ghi dẫn xuất từ các log vừa ghi của 1 user.
+    # items theo thứ tự gửi; consumer có thể gom nhiều request (nhiều ngày) của cùng user vào 1 lượt.
+    # prefs_items / seq: chỉ các log chưa cộng vào PREFS (consumer, xem update_preferences); mặc định = items.
+    # Các bước còn lại là SET / ADD phần chênh lệch -> chạy lại cùng log không đổi kết quả
+    # (logCount cũng chỉ đếm prefs_items; riêng version của DAY# chỉ dùng để nhận biết có thay đổi).
+    fresh = None if prefs_items is None else {id(item) for item in prefs_items}
+    days = {}
+    for item in items:
+        day = days.setdefault(item['dateShort'], {'meals': {}, 'ids': set(), 'count': 0, 'at': 0})
+        if item['mealType'] in MEAL_TYPES:
+            day['meals'][item['mealType']] = item['totalCalories']  # Cùng bữa: log sau ghi đè log trước
+            if fresh is None or id(item) in fresh: day['count'] += 1
+        # Món nhập tay / AI phân tích không có FoodID -> không tính vào danh sách tránh lặp
+        day['ids'].update(f['FoodID'] for f in item['foods'] if f.get('FoodID'))
+        day['at'] = max(day['at'], int(item['loggedAt']))
+
+    for date_str, day in days.items():
+        try:
+            update_recent_dishes(user_id, date_str, day['ids'])
+        except Exception as e:
+            print(f"Lỗi cập nhật recent dishes: {e}")
+
+    # Trọng số sở thích theo ngày của log (không theo lúc ghi) -> ghi trễ qua hàng đợi vẫn như ghi ngay
+    try:
+        catalog, weights = get_food_index(), {}
+        for item in (items if prefs_items is None else prefs_items):
+            add_preference_weights(weights, datetime.strptime(item['dateShort'], '%Y-%m-%d'), item['foods'], catalog)
+        update_preferences(user_id, weights, seq)
+    except Exception as e:
+        print(f"Lỗi cập nhật sở thích: {e}")
+
+    # Tổng calo theo ngày cho /recommend (đọc O(1), không query lại log)
+    # + cộng dồn vào tổng hợp tháng / năm
+    for date_str, day in sorted(days.items()):
+        try:
+            change = update_daily_totals(user_id, date_str, day['meals'], day['at'], day['count'])
+            if change:
+                statuses = update_day_status(user_id, date_str, change, get_tdee(user_id))
+                update_rollups(user_id, date_str, change, statuses)
+        except Exception as e:
+            print(f"Lỗi cập nhật tổng calo ngày: {e}")
+
+    if not requests: return
+    try:
+        bump_log_version(user_id, requests)
+    except Exception as e:
+        print(f"Lỗi cập nhật version: {e}")
+
 def lambda_handler(event, context):
     try:
         # Parse body
@@ -19,7 +317,7 @@ def lambda_handler(event, context):
         user_id = body.get('sub')
         logs = body.get('logs', []) # Danh sách các bữa ăn cần lưu
 
-        if not user_id or not logs:
+        if not user_id or not logs or not isinstance(logs, list):
             return resp(400, {"error": "Thiếu thông tin userId hoặc dữ liệu logs"})
 
         # 👇 SỬA Ở ĐÂY: Lấy giờ VN để xác định ngày
@@ -27,30 +325,28 @@ def lambda_handler(event, context):
         current_date = now_vn.strftime('%Y-%m-%d') # Ra đúng ngày VN (Ví dụ: 2025-12-08)
         
         timestamp = int(time.time())
+        catalog = get_food_index()
+        if find_unknown_foods(logs, catalog):
+            # Có thể catalog vừa được cập nhật mà cache chưa hết hạn -> kiểm tra lại version 1 lần
+            catalog = get_food_index(recheck=True)
+        unknown = find_unknown_foods(logs, catalog)
+        if unknown:
+            return resp(400, {"error": "Món ăn không có trong danh mục", "unknownFoodIds": unknown})
+        items = build_log_items(user_id, logs, catalog, current_date, timestamp)
+
+        # Chế độ buffer (giờ cao điểm): chỉ đẩy vào hàng đợi rồi trả về ngay, consumer.py ghi sau.
+        # Ngày / giờ log đã chốt ở đây nên ghi trễ vẫn đúng ngày.
+        queue = get_queue()
+        if queue and items:
+            queue.send({'sub': user_id, 'items': items})
+            return resp(202, {"message": "Đã nhận nhật ký, đang lưu!"})
 
-        # Duyệt qua từng bữa (breakfast, lunch, dinner) được gửi lên
         with TABLE_LOGS.batch_writer() as batch:
-            for log in logs:
-                meal_type = log.get('meal') 
-                foods = log.get('foods', [])
-                
-                if not foods: continue
-
-                # Tính tổng calo của bữa đó
-                total_cal = sum(float(f.get('Calorie', 0)) for f in foods)
-
-                item = {
-                    'sub': user_id,
-                    'dateMeal': f"{current_date}#{meal_type}", # Key theo ngày VN
-                    'dateShort': current_date,                 # Key theo ngày VN
-                    'mealType': meal_type,
-                    'loggedAt': timestamp,
-                    'totalCalories': Decimal(str(total_cal)),
-                    'foods': foods 
-                }
-                
+            for item in items:
                 batch.put_item(Item=item)
 
+        update_aggregates(user_id, items)
+
         return resp(200, {"message": "Đã lưu nhật ký thành công!"})
 
     except Exception as e:
@@ -0,0 +1,37 @@
+# ============================================================
+# GIẢM ĐIỂM CHO BIỂU ĐỒ: Largest-Triangle-Three-Buckets (LTTB)
+# Giữ điểm đầu, điểm cuối; mỗi bucket ở giữa chọn điểm tạo tam giác lớn nhất với
+# điểm đã chọn trước đó và trung bình bucket kế tiếp -> giữ được đỉnh / đáy của đường.
+# ============================================================
+
+def lttb_indices(xs, ys, threshold):
+    # Trả về chỉ số các điểm được giữ (tăng dần), len <= threshold
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    chosen = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Trung bình bucket kế tiếp
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+
+        # Điểm trong bucket hiện tại tạo tam giác lớn nhất
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        chosen.append(best)
+        a = best
+
+    chosen.append(n - 1)
+    return chosen
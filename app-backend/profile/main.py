@@ -1,15 +1,33 @@
 import json
 import boto3
+import math
 import os
 import time
+from array import array
 from decimal import Decimal # <--- QUAN TRỌNG
-from datetime import datetime
+from datetime import datetime, timedelta
+from boto3.dynamodb.conditions import Key
+
+from downsample import lttb_indices
 
 # Kết nối DynamoDB
 dynamodb = boto3.resource('dynamodb')
 # Lấy tên bảng từ biến môi trường, nếu không có thì dùng tên mặc định
 TABLE_USERS = dynamodb.Table(os.environ.get('USER_TABLE', 'FoodMind-Users'))
 TABLE_HISTORY = dynamodb.Table(os.environ.get('HISTORY_TABLE', 'FoodMind-Update-Tdee'))
+TABLE_STATS = dynamodb.Table(os.environ.get('STATS_TABLE', 'FoodMind-UserStats'))
+
+# Dự báo cân nặng
+KCAL_PER_KG = 7700          # Dư / thiếu ~7700 kcal ≈ tăng / giảm 1 kg
+HABIT_DAYS = 30             # "Thói quen hiện tại" = trung bình calo các ngày có log trong 30 ngày gần nhất
+SCENARIO_STEP = 200         # Kịch bản ăn thêm / bớt ±200 kcal
+MAX_WEEKS = 52
+MIN_TDEE = 1200             # Sàn TDEE trong calculate_stats
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner')  # Thuộc tính calo từng bữa trên item DAY# (log_meal)
+
+# Biểu đồ cân nặng / TDEE dài hạn: tối đa CHART_POINTS điểm dù lịch sử dài bao nhiêu
+CHART_POINTS = 200
+MAX_CHART_POINTS = 1000
 
 # Helper: Tính toán chỉ số cơ thể
 def calculate_stats(weight, height, age, gender, activity, goal):
@@ -39,10 +57,141 @@ def calculate_stats(weight, height, age, gender, activity, goal):
     elif goal == 'gain':
         tdee += 500
     
-    if tdee < 1200: tdee = 1200
+    if tdee < MIN_TDEE: tdee = MIN_TDEE
 
     return bmi, int(bmr), int(tdee)
 
+def get_habit_intake(user_id):
+    # Trung bình calo / ngày từ item tóm tắt ngày (DAY#) do log_meal ghi, không đọc log gốc.
+    # Chỉ các ngày đã qua: hôm nay mới ăn 1-2 bữa sẽ kéo trung bình xuống
+    today = datetime.utcnow() + timedelta(hours=7)
+    start = (today - timedelta(days=HABIT_DAYS)).strftime('%Y-%m-%d')
+    end = (today - timedelta(days=1)).strftime('%Y-%m-%d')
+    res = TABLE_STATS.query(
+        KeyConditionExpression=Key('sub').eq(user_id) & Key('statKey').between(f'DAY#{start}', f'DAY#{end}'),
+        ProjectionExpression='#b, #l, #d',
+        ExpressionAttributeNames={'#b': 'breakfast', '#l': 'lunch', '#d': 'dinner'}
+    )
+    # Tổng ngày = cộng các bữa (item DAY# không lưu tổng)
+    totals = [t for t in (sum(float(i.get(m, 0)) for m in MEAL_TYPES) for i in res.get('Items', [])) if t > 0]
+    return sum(totals) / len(totals) if totals else None
+
+def maintenance_line(height, age, gender, activity):
+    # TDEE duy trì của calculate_stats (goal 'maintain') = slope * cân nặng + offset, sàn MIN_TDEE
+    bmr_offset = 6.25 * float(height) - 5 * int(age) + (5 if gender == 'male' else -161)
+    return 10 * float(activity), bmr_offset * float(activity)
+
+def weight_after(w0, intake, slope, offset, days):
+    # Mỗi ngày: w += (intake - TDEE(w)) / KCAL_PER_KG. TDEE tuyến tính theo w -> w tiến về điểm cân bằng
+    # theo cấp số nhân; dưới ngưỡng sàn TDEE cố định -> w đổi đều. Đường đi đơn điệu nên đổi chế độ tối đa 1 lần.
+    floor_w = (MIN_TDEE - offset) / slope                # Cân nặng mà TDEE chạm sàn
+    target = (intake - offset) / slope                   # Điểm cân bằng khi TDEE không chạm sàn
+    ratio = 1 - slope / KCAL_PER_KG
+    step = (intake - MIN_TDEE) / KCAL_PER_KG             # Thay đổi / ngày khi TDEE ở sàn
+
+    if w0 >= floor_w:
+        if target >= floor_w: return target + (w0 - target) * ratio ** days
+        cross = math.floor(math.log((floor_w - target) / (w0 - target)) / math.log(ratio)) + 1
+        if days <= cross: return target + (w0 - target) * ratio ** days
+        return target + (w0 - target) * ratio ** cross + (days - cross) * step
+
+    if step <= 0: return w0 + days * step
+    cross = math.ceil((floor_w - w0) / step)
+    if days <= cross: return w0 + days * step
+    w = w0 + cross * step
+    return target + (w - target) * ratio ** (days - cross)
+
+def project_weight(user, intake, weeks):
+    # Điểm theo tuần tính thẳng bằng công thức đóng (weight_after), không mô phỏng từng ngày;
+    # TDEE hiển thị vẫn lấy từ calculate_stats cho khớp với hồ sơ
+    w0 = float(user['currentWeight'])
+    args = (user['height'], user['age'], user.get('gender', 'male'), user.get('activityLevel', 1.2), 'maintain')
+    slope, offset = maintenance_line(*args[:4])
+    points = []
+    for week in range(weeks + 1):
+        w = weight_after(w0, intake, slope, offset, 7 * week)
+        points.append({"week": week, "weight": round(w, 1), "tdee": calculate_stats(w, *args)[2]})
+    return points
+
+def iter_history(user_id, date_from=None):
+    # Đọc lần lượt từng trang bảng FoodMind-Update-Tdee, chỉ lấy cột cần vẽ
+    cond = Key('sub').eq(user_id)
+    if date_from: cond = cond & Key('updatedAt').gte(date_from)
+    kwargs = {
+        'KeyConditionExpression': cond,
+        'ProjectionExpression': '#u, #w, #t, #b',
+        'ExpressionAttributeNames': {'#u': 'updatedAt', '#w': 'weight', '#t': 'tdee', '#b': 'bmi'}
+    }
+    while True:
+        res = TABLE_HISTORY.query(**kwargs)
+        yield from res.get('Items', [])
+        if 'LastEvaluatedKey' not in res: return
+        kwargs['ExclusiveStartKey'] = res['LastEvaluatedKey']
+
+def handle_weight_history(user_id, params):
+    try:
+        points = int(params.get('points', CHART_POINTS))
+        date_from = datetime.strptime(params['from'], '%Y-%m-%d').strftime('%Y-%m-%d') if params.get('from') else None
+    except ValueError:
+        return resp(400, {"error": "Invalid points / from"})
+    if not 3 <= points <= MAX_CHART_POINTS: return resp(400, {"error": f"points must be 3-{MAX_CHART_POINTS}"})
+
+    # Chỉ giữ mảng số (epoch, cân nặng, tdee, bmi) -> bộ nhớ ~32 byte / lần cập nhật
+    ts, weights, tdees, bmis = array('d'), array('d'), array('d'), array('d')
+    for item in iter_history(user_id, date_from):
+        try:
+            t = datetime.fromisoformat(item['updatedAt']).timestamp()
+        except (KeyError, ValueError):
+            continue
+        ts.append(t)
+        weights.append(float(item.get('weight', 0)))
+        tdees.append(float(item.get('tdee', 0)))
+        bmis.append(float(item.get('bmi', 0)))
+
+    # Chọn điểm theo đường cân nặng (TDEE tính từ cân nặng nên đi cùng hình dạng)
+    keep = lttb_indices(ts, weights, points)
+    return resp(200, {
+        "totalUpdates": len(ts),
+        "points": [{
+            "date": datetime.fromtimestamp(ts[i]).strftime('%Y-%m-%d'),
+            "weight": round(weights[i], 1),
+            "tdee": int(tdees[i]),
+            "bmi": round(bmis[i], 1)
+        } for i in keep]
+    })
+
+def handle_projection(user_id, params):
+    try:
+        weeks = int(params.get('weeks', 12))
+    except ValueError:
+        weeks = 0
+    if not 1 <= weeks <= MAX_WEEKS: return resp(400, {"error": f"weeks must be 1-{MAX_WEEKS}"})
+
+    user = TABLE_USERS.get_item(Key={'sub': user_id}).get('Item')
+    if not user: return resp(404, {"error": "User not found"})
+    if not all(user.get(k) for k in ('currentWeight', 'height', 'age')):
+        return resp(400, {"error": "Hồ sơ chưa đủ cân nặng / chiều cao / tuổi"})
+
+    # Kịch bản: theo thói quen (nếu có log), theo mục tiêu (tdee đã điều chỉnh theo goal), thói quen ±200
+    habit = get_habit_intake(user_id)
+    base = habit if habit is not None else float(user.get('tdee', 2000))
+    scenarios = {"target": float(user.get('tdee', 2000))}
+    if habit is not None: scenarios["current"] = habit
+    scenarios["less"] = base - SCENARIO_STEP
+    scenarios["more"] = base + SCENARIO_STEP
+
+    result = []
+    for name, intake in scenarios.items():
+        points = project_weight(user, intake, weeks)
+        result.append({
+            "scenario": name,
+            "dailyIntake": int(intake),
+            "points": points,
+            "finalWeight": points[-1]["weight"],
+            "change": round(points[-1]["weight"] - points[0]["weight"], 1)
+        })
+    return resp(200, {"weeks": weeks, "scenarios": result})
+
 def lambda_handler(event, context):
     print("Event:", json.dumps(event))
     
@@ -138,6 +287,24 @@ def lambda_handler(event, context):
                 "bmi": bmi_val
             })
 
+        # ======================================================
+        # API 3: DỰ BÁO CÂN NẶNG N TUẦN TỚI (GET /user/projection)
+        # ======================================================
+        elif route == "GET /user/projection":
+            params = event.get('queryStringParameters') or {}
+            user_id = params.get('userId')
+            if not user_id: return resp(400, {"error": "Missing userId"})
+            return handle_projection(user_id, params)
+
+        # ======================================================
+        # API 4: BIỂU ĐỒ CÂN NẶNG / TDEE DÀI HẠN (GET /user/weight-history)
+        # ======================================================
+        elif route == "GET /user/weight-history":
+            params = event.get('queryStringParameters') or {}
+            user_id = params.get('userId')
+            if not user_id: return resp(400, {"error": "Missing userId"})
+            return handle_weight_history(user_id, params)
+
     except Exception as e:
         print(f"Error: {str(e)}")
         return resp(500, {"error": str(e)})
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import struct
+import sys
+import unicodedata
+from array import array
+from collections import namedtuple
+
+# ============================================================
+# CATALOG NÉN (COMPACT) CHO FoodMind-Foods
+# - Category / NutrientGroup / Unit -> số nguyên (enum)
+# - Meals / RestrictedDiseases     -> bitmask
+# - Calorie                        -> mảng float 32-bit
+# Build: python app-backend/recommend/catalog.py foodmind-foods.json
+# ============================================================
+
+MAGIC = b'FMCAT1\n'
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.bin')
+
+# Bữa ăn: thứ tự cố định -> bit cố định
+MEAL_SLOTS = ('Breakfast', 'Lunch', 'Dinner')
+MEAL_BITS = {name: 1 << i for i, name in enumerate(MEAL_SLOTS)}
+
+# Nhóm món: id cố định để code xử lý request so sánh số nguyên, không so chuỗi
+CAT_MAIN = 0      # 'món ăn'
+CAT_DESSERT = 1   # 'tráng miệng'
+CAT_INGREDIENT = 2  # 'thành phần'
+BASE_CATEGORIES = ('món ăn', 'tráng miệng', 'thành phần')
+
+# (typecode, tên thuộc tính) theo đúng thứ tự ghi trong file
+ARRAY_LAYOUT = (
+    ('B', 'category'),
+    ('H', 'nutrient'),
+    ('H', 'unit'),
+    ('B', 'meals'),
+    ('I', 'restricted'),
+    ('f', 'calories'),
+)
+
+# Danh sách ứng viên: id món + calo tương ứng, cùng sắp theo calo tăng dần (dùng được với bisect)
+Candidates = namedtuple('Candidates', ['ids', 'cals'])
+
+def clean_text(value):
+    # Chuẩn hoá unicode (NFC) + gộp khoảng trắng thừa ('Đạm động vật  + tinh bột')
+    return ' '.join(unicodedata.normalize('NFC', str(value or '')).split())
+
+def normalize_category(value):
+    # 'Món ăn' / 'món ăn ' -> 'món ăn'
+    return clean_text(value).lower()
+
+class Catalog:
+    def __init__(self, version, ids, names, categories, nutrient_groups, units, diseases, arrays):
+        self.version = version
+        self.ids = ids
+        self.names = names
+        self.categories = categories
+        self.nutrient_groups = nutrient_groups
+        self.units = units
+        self.diseases = diseases
+        self.disease_bits = {name: 1 << i for i, name in enumerate(diseases)}
+        self._disease_lookup = {name.lower(): bit for name, bit in self.disease_bits.items()}
+        for _, attr in ARRAY_LAYOUT:
+            setattr(self, attr, arrays[attr])
+        self._foods = {}
+        self._memo = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def disease_mask(self, names):
+        # Bệnh không có trong catalog -> không món nào bị cấm vì bệnh đó
+        mask = 0
+        for name in names:
+            key = clean_text(name).lower()
+            if key.startswith('bệnh '): key = key[5:]  # 'Bệnh Gout' -> 'gout'
+            mask |= self._disease_lookup.get(key, 0)
+        return mask
+
+    def memo(self, key, build):
+        # Bảng tính sẵn gắn với catalog: catalog ứng với 1 version nên bảng cũng chỉ sống theo version đó
+        hit = self._memo.get(key)
+        if hit is None:
+            hit = self._memo[key] = build()
+        return hit
+
+    def candidates(self, meal_bit, disease_mask):
+        # INDEX (bữa, bitmask bệnh) -> (món chính, tráng miệng) dạng Candidates, sắp theo calo tăng dần.
+        return self.memo(('candidates', meal_bit, disease_mask),
+                         lambda: self._build_candidates(meal_bit, disease_mask))
+
+    def _build_candidates(self, meal_bit, disease_mask):
+        if disease_mask:
+            # Lọc từ index không bệnh của cùng bữa: chỉ còn 1 phép AND trên bitmask
+            base_mains, base_desserts = self.candidates(meal_bit, 0)
+            restricted = self.restricted
+            mains = [i for i in base_mains.ids if not restricted[i] & disease_mask]
+            desserts = [i for i in base_desserts.ids if not restricted[i] & disease_mask]
+        else:
+            by_calorie = sorted(range(len(self)), key=self.calories.__getitem__)
+            slot = [i for i in by_calorie if self.meals[i] & meal_bit]
+            mains = [i for i in slot if self.category[i] == CAT_MAIN]
+            desserts = [i for i in slot if self.category[i] == CAT_DESSERT]
+
+        return self._as_candidates(mains), self._as_candidates(desserts)
+
+    def _as_candidates(self, ids):
+        return Candidates(tuple(ids), array('f', (self.calories[i] for i in ids)))
+
+    def food(self, i):
+        # Dựng dict đúng định dạng API cũ (chỉ khi cần trả về cho client)
+        item = self._foods.get(i)
+        if item is None:
+            meals = self.meals[i]
+            restricted = self.restricted[i]
+            item = {
+                "FoodID": self.ids[i],
+                "FoodName": self.names[i],
+                "Category": self.categories[self.category[i]],
+                "NutrientGroup": self.nutrient_groups[self.nutrient[i]],
+                "Unit": self.units[self.unit[i]],
+                "Calorie": round(self.calories[i], 1),
+                "Meals": {slot: bool(meals & bit) for slot, bit in MEAL_BITS.items()},
+                "RestrictedDiseases": [d for d, bit in self.disease_bits.items() if restricted & bit]
+            }
+            self._foods[i] = item
+        return item
+
+def _enum(table, index, value):
+    if value not in index:
+        index[value] = len(table)
+        table.append(value)
+    return index[value]
+
+def compile_foods(items, version=''):
+    # Dùng chung cho file JSON lẫn item DynamoDB (Decimal -> float tại đây, một lần duy nhất)
+    categories = list(BASE_CATEGORIES)
+    cat_index = {c: i for i, c in enumerate(categories)}
+    nutrient_groups, group_index = [], {}
+    units, unit_index = [], {}
+    diseases, disease_index = [], {}
+
+    ids, names = [], []
+    arrays = {attr: array(code) for code, attr in ARRAY_LAYOUT}
+
+    for f in sorted(items, key=lambda x: str(x.get('FoodID', ''))):
+        ids.append(str(f.get('FoodID', '')))
+        names.append(clean_text(f.get('FoodName')))
+        arrays['category'].append(_enum(categories, cat_index, normalize_category(f.get('Category'))))
+        arrays['nutrient'].append(_enum(nutrient_groups, group_index, clean_text(f.get('NutrientGroup'))))
+        arrays['unit'].append(_enum(units, unit_index, clean_text(f.get('Unit'))))
+
+        meals = f.get('Meals', {}) or {}
+        arrays['meals'].append(sum(bit for slot, bit in MEAL_BITS.items() if meals.get(slot)))
+
+        mask = 0
+        for d in f.get('RestrictedDiseases', []) or []:
+            mask |= 1 << _enum(diseases, disease_index, clean_text(d))
+        arrays['restricted'].append(mask)
+
+        arrays['calories'].append(float(f.get('Calorie', 0) or 0))
+
+    if len(diseases) > 32:
+        raise ValueError("Quá 32 loại bệnh, không vừa bitmask 32-bit")
+
+    return Catalog(version, ids, names, categories, nutrient_groups, units, diseases, arrays)
+
+def dump(catalog, path=CATALOG_FILE):
+    header = json.dumps({
+        "version": catalog.version,
+        "count": len(catalog),
+        "categories": catalog.categories,
+        "nutrientGroups": catalog.nutrient_groups,
+        "units": catalog.units,
+        "diseases": catalog.diseases,
+        "ids": catalog.ids,
+        "names": catalog.names
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        for _, attr in ARRAY_LAYOUT:
+            arr = getattr(catalog, attr)
+            if sys.byteorder != 'little':
+                arr = array(arr.typecode, arr)
+                arr.byteswap()
+            f.write(arr.tobytes())
+
+def load(path=CATALOG_FILE):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"File catalog không hợp lệ: {path}")
+        (header_len,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(header_len).decode('utf-8'))
+        count = header['count']
+
+        arrays = {}
+        for code, attr in ARRAY_LAYOUT:
+            arr = array(code)
+            arr.frombytes(f.read(arr.itemsize * count))
+            if sys.byteorder != 'little':
+                arr.byteswap()
+            arrays[attr] = arr
+
+    return Catalog(header['version'], header['ids'], header['names'], header['categories'],
+                   header['nutrientGroups'], header['units'], header['diseases'], arrays)
+
+def build(json_path, out_path=CATALOG_FILE):
+    with open(json_path, 'rb') as f:
+        raw = f.read()
+    # Cùng cách tính version với loaddata.py -> artifact và DynamoDB khớp version
+    version = hashlib.sha1(raw).hexdigest()[:12]
+    catalog = compile_foods(json.loads(raw.decode('utf-8')), version)
+    dump(catalog, out_path)
+    return catalog
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Cách dùng: python catalog.py <foodmind-foods.json> [catalog.bin]")
+        sys.exit(1)
+    out = sys.argv[2] if len(sys.argv) > 2 else CATALOG_FILE
+    cat = build(sys.argv[1], out)
+    print(f"✅ Đã build {len(cat)} món -> {out} ({os.path.getsize(out)} bytes, version {cat.version})")
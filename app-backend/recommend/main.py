@@ -1,159 +1,344 @@
 import json
 import boto3
+import hashlib
 import os
-import random
+import time
 from datetime import datetime, timedelta
 from decimal import Decimal
-from boto3.dynamodb.conditions import Key
+
+import catalog as food_catalog
+import optimizer
+import plate
+import weekly
+import preferences
+from foods import get_catalog_version, scan_foods
+from catalog import MEAL_BITS, Candidates
 
 # 1. KHAI BÁO CORS CHUẨN
 CORS_HEADERS = {
     "Content-Type": "application/json",
     "Access-Control-Allow-Origin": "*",
     "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
-    "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token"
+    "Access-Control-Allow-Headers": "Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,If-None-Match",
+    "Access-Control-Expose-Headers": "ETag"
 }
 
 dynamodb = boto3.resource('dynamodb')
 TABLE_USERS = dynamodb.Table(os.environ.get('USER_TABLE', 'FoodMind-Users'))
-TABLE_LOGS = dynamodb.Table(os.environ.get('LOGS_TABLE', 'FoodMind-MealLogs'))
-TABLE_FOODS = dynamodb.Table(os.environ.get('FOOD_TABLE', 'FoodMind-Foods'))
+TABLE_STATS = dynamodb.Table(os.environ.get('STATS_TABLE', 'FoodMind-UserStats'))
+
+# Không gợi ý lại món đã ăn hôm nay và RECENT_DAYS ngày trước đó
+RECENT_DAYS = int(os.environ.get('RECENT_DAYS', '2'))
+RECENT_DISHES_KEY = 'RECENT_DISHES'  # item ghi bởi log_meal
+DAY_PREFIX = 'DAY#'                  # item DAY#<ngày>: calo đã ăn theo bữa, ghi bởi log_meal
+
+# CACHE DANH MỤC MÓN ĂN: sống ở cấp module nên được giữ lại giữa các lần gọi (warm container)
+CATALOG_TTL = int(os.environ.get('CATALOG_TTL', '300'))  # giây
+_catalog_cache = {"version": None, "catalog": None, "checked_at": 0.0, "bundled": False}
+
+DEFAULT_OPTIONS = 2
+MAX_OPTIONS = 10
+MAX_EXCLUDE = 50  # Số FoodID tối đa nhận qua ?exclude= (client gửi món của các option đang hiện)
+
+# Tỉ lệ budget 30/40/30 theo bữa
+MEAL_CONFIGS = {
+    "breakfast": {"percent": 0.30, "db_key": "Breakfast"},
+    "lunch":     {"percent": 0.40, "db_key": "Lunch"},
+    "dinner":    {"percent": 0.30, "db_key": "Dinner"}
+}
+
+# Thực đơn đã tính trong ngày được lưu lại (item PLAN#<ngày>), tự xoá bằng DynamoDB TTL
+PLAN_TTL_DAYS = 3
 
-# ... (Giữ nguyên các hàm get_vietnam_time, get_history_blacklist, generate_combo không đổi) ...
 def get_vietnam_time():
     return datetime.utcnow() + timedelta(hours=7)
 
-def get_history_blacklist(user_id):
-    blacklist = set()
-    today = get_vietnam_time()
-    dates_to_check = []
-    for i in range(1, 3): 
-        d = (today - timedelta(days=i)).strftime('%Y-%m-%d')
-        dates_to_check.append(d)
+def blacklist_from_item(item, cutoff):
+    # item RECENT_DISHES: 'f#<FoodID>' -> ngày ăn gần nhất
+    return {attr[2:] for attr, last_date in (item or {}).items() if attr.startswith('f#') and last_date >= cutoff}
+
+def get_recent_cutoff(on_date=None, days=RECENT_DAYS):
+    on_date = on_date or get_vietnam_time()
+    return (on_date - timedelta(days=days)).strftime('%Y-%m-%d')
+
+def get_history_blacklist(user_id, days=RECENT_DAYS):
+    # 1 lần GetItem bản ghi món gần đây (FoodID -> ngày ăn gần nhất), không query log từng ngày
     try:
-        for d in dates_to_check:
-            resp = TABLE_LOGS.query(
-                KeyConditionExpression=Key('sub').eq(user_id) & Key('dateMeal').begins_with(d)
-            )
-            for item in resp.get('Items', []):
-                for food in item.get('foods', []):
-                    if food.get('category') == 'món ăn': 
-                        blacklist.add(food.get('foodName'))
+        res = TABLE_STATS.get_item(Key={'sub': user_id, 'statKey': RECENT_DISHES_KEY})
+        return blacklist_from_item(res.get('Item'), get_recent_cutoff(days=days))
     except Exception as e:
         print(f"Lỗi blacklist: {e}")
-    return blacklist
-
-def generate_combo(mains, desserts, budget, exclude_names=[]):
-    available_mains = [m for m in mains if m['FoodName'] not in exclude_names]
-    if not available_mains: available_mains = mains
-    if not available_mains: return None
-
-    random.shuffle(available_mains)
-    selected_main = None
-    selected_dessert = None
-    total_calo = 0
-
-    for main in available_mains:
-        cal = float(main.get('Calorie', 0))
-        if cal <= budget:
-            selected_main = main
-            total_calo += cal
-            break
-    
-    if not selected_main and available_mains:
-        selected_main = min(available_mains, key=lambda x: float(x.get('Calorie', 0)))
-        total_calo = float(selected_main.get('Calorie', 0))
-
-    remaining = budget - total_calo
-    if remaining > 30:
-        valid_desserts = [d for d in desserts if float(d.get('Calorie', 0)) <= remaining]
-        if valid_desserts:
-            selected_dessert = random.choice(valid_desserts)
-            total_calo += float(selected_dessert.get('Calorie', 0))
-
-    combo_items = []
-    if selected_main: combo_items.append(selected_main)
-    if selected_dessert: combo_items.append(selected_dessert)
+        return set()
+
+def parse_conditions(limit_health):
+    # limitHealth: 'Không' | 'Gout' | 'Gout, Thừa cân' | ['Gout', 'Thừa cân']
+    if not limit_health: return []
+    if isinstance(limit_health, str):
+        limit_health = limit_health.split(',')
+    return [c.strip() for c in limit_health if c and c.strip() and c.strip() != 'Không']
+
+def get_catalog():
+    cache = _catalog_cache
+    now = time.time()
+    if cache['catalog'] and now - cache['checked_at'] < CATALOG_TTL:
+        return cache['catalog']
+
+    # Ưu tiên file catalog.bin đóng gói cùng Lambda (cold start không scan), nhưng vẫn so version
+    # với DynamoDB như bản scan: loaddata.py nạp catalog mới mà chưa deploy lại -> dùng bản scan
+    if cache['catalog'] is None and os.path.exists(food_catalog.CATALOG_FILE):
+        cache['catalog'] = food_catalog.load()
+        cache['version'] = cache['catalog'].version
+        cache['bundled'] = True
+
+    try:
+        version = get_catalog_version()
+    except Exception as e:
+        print(f"Lỗi đọc catalog version: {e}")
+        if cache['catalog']: return cache['catalog']  # Giữ bản cũ còn hơn lỗi
+        version = ''
+
+    # Không có version item -> không biết catalog có đổi hay không: bản đóng gói giữ nguyên,
+    # bản scan nạp lại sau mỗi TTL
+    stale = version != cache['version'] if version else not cache['bundled']
+    if not cache['catalog'] or stale:
+        cache['catalog'] = food_catalog.compile_foods(scan_foods(), version)
+        cache['version'] = version
+        cache['bundled'] = False
+    cache['checked_at'] = now
+    return cache['catalog']
+
+def generate_combos(catalog, mains, desserts, budget, count, bonus=None):
+    # Xếp hạng theo độ khớp budget (+ sở thích) rồi chọn count combo khác nhau nhất (xem optimizer.py)
+    combos = []
+    for ids, total in optimizer.top_k_combos(catalog, mains, [desserts], budget, count, bonus=bonus):
+        combos.append({
+            "items": [catalog.food(i) for i in ids],
+            "totalCalorie": int(total)
+        })
+    return combos
+
+def parse_option_count(params):
+    try:
+        n = int(params.get('options', DEFAULT_OPTIONS))
+    except (TypeError, ValueError):
+        n = DEFAULT_OPTIONS
+    return max(1, min(n, MAX_OPTIONS))
+
+def get_eaten(day_item):
+    # {bữa: calo đã log hôm nay}; bữa chưa log thì không có key
+    return {m: float(day_item[m]) for m in MEAL_CONFIGS if day_item and m in day_item}
+
+def get_meal_budgets(tdee, eaten):
+    # Bữa đã ăn giữ budget gốc; phần calo còn lại chia cho các bữa chưa ăn theo đúng tỉ lệ 30/40/30
+    budgets = {m: tdee * c["percent"] for m, c in MEAL_CONFIGS.items()}
+    open_meals = [m for m in MEAL_CONFIGS if m not in eaten]
+    if not eaten or not open_meals: return budgets
+
+    remaining = max(0.0, tdee - sum(eaten.values()))
+    share = sum(MEAL_CONFIGS[m]["percent"] for m in open_meals)
+    for m in open_meals:
+        budgets[m] = remaining * MEAL_CONFIGS[m]["percent"] / share
+    return budgets
+
+def recommend_meal(catalog, meal_key, budget, disease_mask, blacklist, mode, option_count, bonus=None):
+    meal_bit = MEAL_BITS[MEAL_CONFIGS[meal_key]["db_key"]]
+
+    if mode == 'plate':
+        # Nguyên liệu không nằm trong blacklist (blacklist chỉ áp cho món ăn)
+        options = plate.build_plates(catalog, meal_bit, disease_mask, budget, option_count)
+    else:
+        # Tra index đã dựng sẵn theo (bữa, bệnh), không quét lại toàn bộ catalog
+        mains, desserts = catalog.candidates(meal_bit, disease_mask)
+        if blacklist:
+            keep = [k for k, i in enumerate(mains.ids) if catalog.ids[i] not in blacklist]
+            if keep:  # Blacklist loại hết thì dùng lại danh sách đầy đủ
+                mains = Candidates(tuple(mains.ids[k] for k in keep), [mains.cals[k] for k in keep])
+
+        # N lựa chọn trong 1 lượt (?options=N)
+        options = generate_combos(catalog, mains, desserts, budget, option_count, bonus)
+
+    return {
+        "budget": int(budget),
+        "options": options
+    }
+
+def get_plan_key(user, catalog, mode, option_count, day_item=None):
+    # Plan chỉ dùng lại được khi hồ sơ (updatedAt), calo đã ăn hôm nay, catalog và tham số gợi ý đều không đổi
+    intake = (day_item or {}).get('version', '')
+    return f"{user.get('updatedAt', '')}|{intake}|{catalog.version}|{mode}|{option_count}"
 
+def get_plan_etag(plan_key, date_str, plan_item=None):
+    # ETag của gợi ý cả ngày: planKey (hồ sơ + calo đã ăn + catalog + tham số) + ngày
+    # + số lần đổi 1 bữa (rev) -> trình duyệt gửi If-None-Match, không đổi gì thì trả 304
+    rev = (plan_item or {}).get('rev', 0) if (plan_item or {}).get('planKey') == plan_key else 0
+    raw = f"{plan_key}|{date_str}|{rev}"
+    return '"' + hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20] + '"'
+
+def get_if_none_match(event):
+    headers = event.get('headers') or {}
+    value = headers.get('if-none-match') or headers.get('If-None-Match') or ''
+    return [v.strip().removeprefix('W/') for v in value.split(',') if v.strip()]
+
+def plan_from_item(item, plan_key):
+    if not item or item.get('planKey') != plan_key: return None
+    if not all(m in item for m in MEAL_CONFIGS): return None
+    return {m: json.loads(item[m]) for m in MEAL_CONFIGS}
+
+def build_plan_item(user_id, date_str, plan_key, meals):
+    # Mỗi bữa lưu thành 1 chuỗi JSON riêng -> đổi 1 bữa chỉ cần SET 1 thuộc tính
     return {
-        "items": combo_items,
-        "totalCalorie": int(total_calo)
+        'sub': user_id,
+        'statKey': f'PLAN#{date_str}',
+        'planKey': plan_key,
+        'expiresAt': int(time.time()) + PLAN_TTL_DAYS * 86400,
+        **{m: json.dumps(v, cls=DecimalEncoder, ensure_ascii=False) for m, v in meals.items()}
     }
 
+def get_request_items(user_id, date_str, with_plan=True):
+    # User + calo đã ăn hôm nay + sở thích (+ plan hôm nay) trong 1 lượt BatchGetItem
+    # (plan có thể do job precompute.py ghi sẵn). Trả về (user, {'day'|'prefs'|'plan': item})
+    user_key = {'sub': user_id}
+    stat_names = {f'{DAY_PREFIX}{date_str}': 'day', preferences.PREFS_KEY: 'prefs'}
+    if with_plan:
+        stat_names[f'PLAN#{date_str}'] = 'plan'
+
+    res = dynamodb.batch_get_item(RequestItems={
+        TABLE_USERS.name: {'Keys': [user_key]},
+        TABLE_STATS.name: {'Keys': [{'sub': user_id, 'statKey': k} for k in stat_names]}
+    })
+    found = res.get('Responses', {})
+    users = found.get(TABLE_USERS.name, [])
+    stats = {stat_names[item['statKey']]: item for item in found.get(TABLE_STATS.name, [])}
+
+    # Key bị throttle (UnprocessedKeys) -> đọc lại từng cái
+    unprocessed = res.get('UnprocessedKeys', {})
+    if TABLE_USERS.name in unprocessed:
+        users = [TABLE_USERS.get_item(Key=user_key).get('Item')]
+    for key in unprocessed.get(TABLE_STATS.name, {}).get('Keys', []):
+        item = TABLE_STATS.get_item(Key=key).get('Item')
+        if item: stats[stat_names[item['statKey']]] = item
+
+    return (users[0] if users else None), stats
+
+def save_plan(user_id, date_str, plan_key, meals, partial=False):
+    if not partial:
+        TABLE_STATS.put_item(Item=build_plan_item(user_id, date_str, plan_key, meals))
+        return
+
+    # Chỉ ghi đè bữa vừa tính lại nếu plan đang lưu cùng key (khác key -> lần tải sau tự tính lại)
+    encoded = {m: json.dumps(v, cls=DecimalEncoder, ensure_ascii=False) for m, v in meals.items()}
+    names = {f'#m{n}': m for n, m in enumerate(encoded)}
+    values = {f':m{n}': v for n, v in enumerate(encoded.values())}
+    try:
+        TABLE_STATS.update_item(
+            Key={'sub': user_id, 'statKey': f'PLAN#{date_str}'},
+            UpdateExpression='SET ' + ', '.join(f'#m{n} = :m{n}' for n in range(len(encoded))) + ' ADD #r :one',
+            ConditionExpression='planKey = :k',
+            ExpressionAttributeNames={**names, '#r': 'rev'},
+            ExpressionAttributeValues={**values, ':k': plan_key, ':one': 1}
+        )
+    except Exception as e:
+        print(f"Bỏ qua cập nhật plan: {e}")
+
+def compute_plan(user, catalog, blacklist, mode='combo', option_count=DEFAULT_OPTIONS, meal_keys=None,
+                 eaten=None, prefs_item=None, on_date=None):
+    # Dùng chung cho API và job tính trước (precompute.py)
+    eaten = eaten or {}
+    bonus = preferences.preference_scores(catalog, prefs_item, on_date or get_vietnam_time())
+    budgets = get_meal_budgets(float(user.get('tdee', 2000)), eaten)
+    # Nhiều bệnh cùng lúc -> OR các bit lại thành 1 mask
+    disease_mask = catalog.disease_mask(parse_conditions(user.get('limitHealth', 'Không')))
+
+    plan = {}
+    for m in (meal_keys or MEAL_CONFIGS):
+        plan[m] = recommend_meal(catalog, m, budgets[m], disease_mask, blacklist, mode, option_count, bonus)
+        if m in eaten: plan[m]["eaten"] = int(eaten[m])
+    return plan
+
+def handle_week(user_id):
+    # GET /recommend/week: 21 bữa cho 7 ngày tới trong 1 lần gọi
+    user = TABLE_USERS.get_item(Key={'sub': user_id}).get('Item')
+    if not user: return resp(404, {"error": "User not found"})
+
+    catalog = get_catalog()
+    budgets = get_meal_budgets(float(user.get('tdee', 2000)), {})
+    disease_mask = catalog.disease_mask(parse_conditions(user.get('limitHealth', 'Không')))
+    blacklist = get_history_blacklist(user_id)
+
+    days, relaxed = weekly.plan_week(catalog, budgets, disease_mask, blacklist, MEAL_CONFIGS)
+
+    today = get_vietnam_time()
+    return resp(200, {
+        "days": [
+            {"date": (today + timedelta(days=n)).strftime('%Y-%m-%d'), "meals": meals}
+            for n, meals in enumerate(days)
+        ],
+        # True = hết thời gian tìm kiếm, 1 vài bữa có thể lặp món sớm hơn quy định
+        "relaxed": relaxed
+    })
+
 def lambda_handler(event, context):
     # XỬ LÝ OPTIONS (PREFLIGHT)
     route = event.get('routeKey', '')
     if route and route.startswith("OPTIONS"):
             return resp(200, {"message": "CORS Preflight OK"})
 
-    user_id = event.get('queryStringParameters', {}).get('userId')
+    params = event.get('queryStringParameters') or {}
+    user_id = params.get('userId')
     if not user_id: return resp(400, {"error": "Missing userId"})
 
+    if route == "GET /recommend/week":
+        try:
+            return handle_week(user_id)
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            return resp(500, {"error": str(e)})
+
+    option_count = parse_option_count(params)
+    # mode=combo (mặc định): món ăn + tráng miệng | mode=plate: tự ghép đĩa từ nguyên liệu
+    mode = params.get('mode', 'combo')
+    if mode not in ('combo', 'plate'): return resp(400, {"error": "Invalid mode"})
+    # meal=lunch: chỉ tính lại 1 bữa (nút "Gợi ý" trên từng bữa)
+    only_meal = params.get('meal')
+    if only_meal and only_meal not in MEAL_CONFIGS: return resp(400, {"error": "Invalid meal"})
+    # exclude=id1,id2: món đang hiện trên bữa đó -> bỏ khỏi món chính để lần "đổi món" ra món khác
+    exclude = {fid for fid in params.get('exclude', '').split(',')[:MAX_EXCLUDE] if fid} if only_meal else set()
+
     try:
-        # 1. Lấy thông tin User
-        user_res = TABLE_USERS.get_item(Key={'sub': user_id})
-        user = user_res.get('Item')
+        now_vn = get_vietnam_time()
+        today_str = now_vn.strftime('%Y-%m-%d')
+
+        # 1. Lấy User + calo đã ăn hôm nay + sở thích (+ plan hôm nay nếu tải cả ngày),
+        #    catalog (file đóng gói hoặc cache DynamoDB)
+        user, stats = get_request_items(user_id, today_str, with_plan=not only_meal)
         if not user: return resp(404, {"error": "User not found"})
-        
-        tdee = float(user.get('tdee', 2000))
-        limit_health = user.get('limitHealth', 'Không')
-
-        # 2. Lấy Blacklist
-        blacklist = get_history_blacklist(user_id)
-
-        # 3. Lấy tất cả món ăn
-        foods_res = TABLE_FOODS.scan()
-        all_foods = foods_res.get('Items', [])
-
-        # 4. Tính Budget Calo
-        meal_configs = {
-            "breakfast": {"percent": 0.30, "db_key": "Breakfast"},
-            "lunch":     {"percent": 0.40, "db_key": "Lunch"},
-            "dinner":    {"percent": 0.30, "db_key": "Dinner"}
-        }
-        
-        recommendations = {}
-
-        for meal_key, config in meal_configs.items():
-            budget = tdee * config["percent"]
-            db_meal_key = config["db_key"]
-            
-            mains = []
-            desserts = []
-            
-            for f in all_foods:
-                # 1. Lọc bệnh lý
-                if limit_health != 'Không' and limit_health in f.get('RestrictedDiseases', []): continue
-                
-                # 2. Lọc thời gian (Bữa)
-                if not f.get('Meals', {}).get(db_meal_key, False): continue
-
-                cat = f.get('Category', '').strip()
-                
-                if cat == 'món ăn':
-                    if f.get('FoodName') not in blacklist: 
-                        mains.append(f)
-                elif cat == 'tráng miệng':
-                    desserts.append(f)
-                else:
-                    continue
-
-            # Option 1
-            option1 = generate_combo(mains, desserts, budget, exclude_names=[])
-            
-            # Option 2
-            exclude_list = []
-            if option1 and len(option1['items']) > 0:
-                exclude_list.append(option1['items'][0]['FoodName'])
-            
-            option2 = generate_combo(mains, desserts, budget, exclude_names=exclude_list)
-
-            recommendations[meal_key] = {
-                "budget": int(budget),
-                "options": [option1, option2]
-            }
-
-        return resp(200, recommendations)
+        day_item = stats.get('day')
+
+        catalog = get_catalog()
+        plan_key = get_plan_key(user, catalog, mode, option_count, day_item)
+
+        # 2. Tải cả ngày: trình duyệt đã có đúng bản này (If-None-Match) -> 304, không tính gì thêm;
+        #    plan đã lưu (tính trước hoặc lần tải trước) còn hợp lệ -> trả luôn
+        etag = None if only_meal else get_plan_etag(plan_key, today_str, stats.get('plan'))
+        if etag and etag in get_if_none_match(event): return not_modified(etag)
+        saved = plan_from_item(stats.get('plan'), plan_key)
+        if saved: return resp(200, saved, etag)
+
+        # 3. Lấy Blacklist (tập FoodID) + món đang hiện (chỉ khi đổi 1 bữa)
+        blacklist = get_history_blacklist(user_id) | exclude
+
+        # 4. Tính gợi ý cho các bữa cần thiết
+        meal_keys = [only_meal] if only_meal else list(MEAL_CONFIGS)
+        # Budget các bữa chưa ăn tính trên phần calo còn lại trong ngày; xếp hạng có tính sở thích
+        recommendations = compute_plan(user, catalog, blacklist, mode, option_count, meal_keys,
+                                       eaten=get_eaten(day_item), prefs_item=stats.get('prefs'), on_date=now_vn)
+
+        try:
+            save_plan(user_id, today_str, plan_key, recommendations, partial=bool(only_meal))
+        except Exception as e:
+            print(f"Lỗi lưu plan: {e}")
+
+        return resp(200, recommendations, etag)
 
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -165,9 +350,20 @@ class DecimalEncoder(json.JSONEncoder):
         return super(DecimalEncoder, self).default(obj)
 
 # HÀM RESP CHUẨN (DÙNG CORS_HEADERS)
-def resp(code, body):
+def resp(code, body, etag=None):
+    headers = CORS_HEADERS
+    if etag:
+        # no-cache: trình duyệt được giữ bản cũ nhưng lần nào cũng hỏi lại bằng If-None-Match
+        headers = {**CORS_HEADERS, "ETag": etag, "Cache-Control": "no-cache"}
     return {
         "statusCode": code,
-        "headers": CORS_HEADERS,
+        "headers": headers,
         "body": json.dumps(body, cls=DecimalEncoder, ensure_ascii=False)
+    }
+
+def not_modified(etag):
+    return {
+        "statusCode": 304,
+        "headers": {**CORS_HEADERS, "ETag": etag, "Cache-Control": "no-cache"},
+        "body": ""
     }
\ No newline at end of file
@@ -0,0 +1,100 @@
+import heapq
+import math
+import random
+from bisect import bisect_right
+
+# ============================================================
+# TỐI ƯU COMBO: xếp hạng theo độ khớp budget + chọn k combo đa dạng (MMR)
+# Món chính + tráng miệng (+ món phụ tuỳ chọn), mỗi nhóm là Candidates đã sắp theo calo.
+# ============================================================
+
+BUDGET_TOLERANCE = 0.05   # Cho phép vượt budget tối đa 5% (bị phạt gấp đôi)
+NEIGHBORS = 3             # Số món gần điểm bisect được xét cho mỗi nhóm phụ (cắt tỉa)
+POOL_FACTOR = 8           # Giữ lại k * POOL_FACTOR combo tốt nhất trước bước MMR
+MMR_LAMBDA = 0.7          # 1.0 = chỉ xét độ khớp budget, 0.0 = chỉ xét đa dạng
+JITTER = 0.03             # Nhiễu nhỏ khi xếp hạng (plate.py, weekly.py)
+TEMPERATURE = 0.02        # Bốc combo từ pool theo softmax(điểm MMR / TEMPERATURE): nhỏ = gần như luôn lấy combo tốt nhất
+MIN_EXTRA = 30            # Budget còn lại dưới mức này thì không thêm món phụ
+PREF_WEIGHT = 0.15        # Trọng số điểm sở thích của user (độ khớp budget vẫn quan trọng hơn)
+
+def fit_score(total, budget):
+    # 1.0 = khớp đúng budget; vượt budget bị trừ gấp đôi
+    if budget <= 0: return 0.0
+    gap = (budget - total) / budget
+    return 1.0 - (gap if gap >= 0 else -2 * gap)
+
+def _near(cands, target):
+    # Các vị trí có calo gần target nhất và không vượt target (cộng thêm dung sai)
+    hi = bisect_right(cands.cals, target)
+    return range(max(0, hi - NEIGHBORS), hi)
+
+def enumerate_combos(mains, extras, budget):
+    # Duyệt có chặn: mỗi món chính chỉ ghép với vài món phụ sát phần budget còn lại,
+    # nên chi phí ~ O(M * (log D + NEIGHBORS)) thay vì O(M * D).
+    limit = budget * (1 + BUDGET_TOLERANCE)
+    fit = bisect_right(mains.cals, limit)
+    main_range = range(fit) if fit else range(min(1, len(mains.ids)))  # không món nào vừa -> món nhẹ nhất
+
+    for m in main_range:
+        partials = [((mains.ids[m],), mains.cals[m])]
+        for cands in extras:
+            grown = []
+            for ids, total in partials:
+                grown.append((ids, total))  # không lấy món ở nhóm này
+                left = limit - total
+                if left < MIN_EXTRA or not cands.ids: continue
+                for d in _near(cands, left):
+                    grown.append((ids + (cands.ids[d],), total + cands.cals[d]))
+            partials = grown
+        for ids, total in partials:
+            yield ids, total
+
+def _similarity(a, b):
+    # Trùng FoodID nặng hơn trùng NutrientGroup
+    same_food = len(a[0] & b[0]) / len(a[0] | b[0])
+    same_group = len(a[1] & b[1]) / len(a[1] | b[1])
+    return min(1.0, same_food + 0.5 * same_group)
+
+def _sample(values, rng):
+    # Chọn 1 vị trí theo softmax; None = đã chọn / bỏ qua
+    top = max(v for v in values if v is not None)
+    weights = [0.0 if v is None else math.exp((v - top) / TEMPERATURE) for v in values]
+    return rng.choices(range(len(values)), weights)[0]
+
+def top_k_combos(catalog, mains, extras, budget, k, rng=random, bonus=None):
+    # bonus: điểm sở thích [0, 1] theo chỉ số món trong catalog (preferences.py), có thể None
+    if not mains.ids or k <= 0: return []
+
+    def score(ids, total):
+        s = fit_score(total, budget)
+        if bonus is not None:
+            s += PREF_WEIGHT * sum(bonus[i] for i in ids) / len(ids)
+        return s
+
+    # Pool = k * POOL_FACTOR combo điểm cao nhất (xếp hạng cố định); mỗi lượt MMR bốc ngẫu nhiên theo
+    # softmax thay vì luôn lấy max -> bấm "đổi món" ra combo khác trong pool, combo lệch budget xa hiếm khi ra
+    scored = ((score(ids, total), ids, total) for ids, total in enumerate_combos(mains, extras, budget))
+    pool = heapq.nlargest(k * POOL_FACTOR, scored, key=lambda x: x[0])
+
+    features = [(frozenset(ids), frozenset(catalog.nutrient[i] for i in ids)) for _, ids, _ in pool]
+    chosen = []
+    max_sim = [0.0] * len(pool)
+    while pool and len(chosen) < k:
+        vals = [None if max_sim[p] is None else MMR_LAMBDA * score - (1 - MMR_LAMBDA) * max_sim[p]
+                for p, (score, _, _) in enumerate(pool)]
+        if all(v is None for v in vals): break
+        best = _sample(vals, rng)
+
+        chosen.append(pool[best])
+        max_sim[best] = None
+        # Cập nhật tăng dần độ giống nhất với tập đã chọn (không tính lại từ đầu)
+        for p in range(len(pool)):
+            if max_sim[p] is not None:
+                max_sim[p] = max(max_sim[p], _similarity(features[p], features[best]))
+
+    # Ít combo hơn k (catalog quá nhỏ) -> lặp lại các combo tốt nhất
+    base = len(chosen)
+    while chosen and len(chosen) < k:
+        chosen.append(chosen[len(chosen) % base])
+
+    return [(ids, total) for _, ids, total in chosen]
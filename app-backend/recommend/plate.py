@@ -0,0 +1,124 @@
+import random
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+from catalog import CAT_INGREDIENT
+from optimizer import fit_score, JITTER
+
+# ============================================================
+# PLATE BUILDER: ghép bữa từ nguyên liệu ('thành phần')
+# 1 đạm + 1 tinh bột + 1 rau, khẩu phần theo bội số của đơn vị (chủ yếu 100g)
+# ============================================================
+
+# Vai trò -> NutrientGroup (đã chuẩn hoá), tỉ lệ calo mục tiêu, các mức khẩu phần (x đơn vị)
+ROLES = (
+    ('protein', ('Đạm động vật', 'Đạm thực vật'), 0.40, (0.5, 1.0, 1.5, 2.0, 2.5)),
+    ('starch',  ('Tinh bột',),                    0.45, (0.5, 1.0, 1.5, 2.0, 2.5, 3.0)),
+    ('veg',     ('Rau củ quả',),                  0.15, (1.0, 1.5, 2.0, 3.0)),
+)
+# Đơn vị đếm theo cái/quả thì chỉ cho khẩu phần nguyên
+WHOLE_PORTIONS = (1.0, 2.0, 3.0)
+WINDOW = 5           # Số lựa chọn quanh calo mục tiêu được xét cho đạm và rau
+BALANCE_WEIGHT = 0.5 # Mức phạt khi tỉ lệ calo các nhóm lệch khỏi mục tiêu
+
+class RoleTable:
+    # Mọi (nguyên liệu, khẩu phần) của 1 vai trò, sắp theo calo -> bisect được
+    def __init__(self, options):
+        options.sort()
+        self.cals = array('f', (o[0] for o in options))
+        self.foods = [o[1] for o in options]
+        self.portions = [o[2] for o in options]
+
+    def __len__(self):
+        return len(self.foods)
+
+    def around(self, target, width):
+        mid = bisect_left(self.cals, target)
+        return range(max(0, mid - width), min(len(self), mid + width))
+
+    def below(self, target, width):
+        hi = bisect_right(self.cals, target)
+        return range(max(0, hi - width), hi)
+
+def _portion_steps(unit, steps):
+    return steps if re.match(r'^\d+\s*g$', unit) else WHOLE_PORTIONS
+
+def build_tables(catalog, meal_bit, disease_mask):
+    tables = {}
+    for role, groups, _, steps in ROLES:
+        group_ids = {g for g, name in enumerate(catalog.nutrient_groups) if name in groups}
+        options = []
+        for i in range(len(catalog)):
+            if catalog.category[i] != CAT_INGREDIENT: continue
+            if catalog.nutrient[i] not in group_ids: continue
+            if not catalog.meals[i] & meal_bit: continue
+            if catalog.restricted[i] & disease_mask: continue
+            for portion in _portion_steps(catalog.units[catalog.unit[i]], steps):
+                options.append((catalog.calories[i] * portion, i, portion))
+        tables[role] = RoleTable(options)
+    return tables
+
+def get_tables(catalog, meal_bit, disease_mask):
+    return catalog.memo(('plate', meal_bit, disease_mask),
+                        lambda: build_tables(catalog, meal_bit, disease_mask))
+
+def _plate_score(parts, total, budget):
+    # Khớp budget, trừ điểm nếu tỉ lệ đạm / tinh bột / rau lệch mục tiêu
+    if total <= 0: return 0.0
+    balance = sum(abs(cal / total - share) for cal, share in parts)
+    return fit_score(total, budget) - BALANCE_WEIGHT * balance
+
+def build_plates(catalog, meal_bit, disease_mask, budget, count, rng=random):
+    tables = get_tables(catalog, meal_bit, disease_mask)
+    protein, starch, veg = tables['protein'], tables['starch'], tables['veg']
+    if not len(protein): return []
+    shares = {role: share for role, _, share, _ in ROLES}
+
+    # Bữa không có tinh bột/rau (vd. bữa sáng) -> chia lại tỉ lệ cho các nhóm còn lại
+    active = [r for r in ('protein', 'starch', 'veg') if len(tables[r])]
+    norm = sum(shares[r] for r in active)
+    shares = {r: shares[r] / norm for r in active}
+
+    plates = []
+    veg_range = veg.around(budget * shares['veg'], WINDOW) if 'veg' in shares else [None]
+    for p in protein.around(budget * shares['protein'], WINDOW):
+        for v in veg_range:
+            base = protein.cals[p] + (veg.cals[v] if v is not None else 0)
+            starch_range = starch.below(budget - base, 2) if 'starch' in shares else [None]
+            for s in starch_range or [None]:
+                total = base + (starch.cals[s] if s is not None else 0)
+                parts = [(protein.cals[p], shares['protein'])]
+                if v is not None: parts.append((veg.cals[v], shares['veg']))
+                if s is not None: parts.append((starch.cals[s], shares['starch']))
+                score = _plate_score(parts, total, budget) + rng.uniform(0, JITTER)
+                plates.append((score, total, (protein, p), (starch, s), (veg, v)))
+
+    plates.sort(key=lambda x: x[0], reverse=True)
+
+    # Chọn count đĩa, ưu tiên không lặp lại nguồn đạm / tinh bột
+    chosen, used = [], set()
+    for plate in plates:
+        key = tuple(table.foods[idx] for table, idx in plate[2:4] if idx is not None)
+        if used & set(key): continue
+        chosen.append(plate)
+        used.update(key)
+        if len(chosen) == count: break
+    for plate in plates:
+        if len(chosen) >= count: break
+        if plate not in chosen: chosen.append(plate)
+
+    return [_format_plate(catalog, plate) for plate in chosen]
+
+def _format_plate(catalog, plate):
+    items = []
+    for table, idx in plate[2:]:
+        if idx is None: continue
+        item = dict(catalog.food(table.foods[idx]))
+        item["Portion"] = table.portions[idx]
+        item["Calorie"] = round(table.cals[idx], 1)
+        items.append(item)
+    return {
+        "items": items,
+        "totalCalorie": int(plate[1])
+    }
@@ -0,0 +1,105 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# 'foods' (đọc catalog, dùng chung) nằm trong layer shared/ -> chạy script local thì thêm vào path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+
+import main as recommend  # noqa: E402
+
+# ============================================================
+# JOB TÍNH TRƯỚC THỰC ĐƠN NGÀY MAI CHO TẤT CẢ USER (chạy hằng đêm)
+# - Scan song song FoodMind-Users theo segment, mỗi segment 1 process
+# - Ghi PLAN#<ngày> vào FoodMind-UserStats bằng batch write
+# GET /recommend đọc plan này cùng user trong 1 lượt BatchGetItem, chỉ tính live khi miss.
+# Chạy: python precompute.py [--date YYYY-MM-DD] [--segments 8] [--workers 4]
+# ============================================================
+
+BATCH_GET_LIMIT = 100  # Giới hạn key / BatchGetItem của DynamoDB
+MAX_RETRIES = 8        # Số lần thử lại UnprocessedKeys (backoff 50ms, 100ms, ... tối đa 5s)
+
+def load_stats(user_ids, stat_keys):
+    # Đọc các item FoodMind-UserStats (món gần đây, sở thích...) của cả trang user, 100 key / lượt
+    # -> {(sub, statKey): item}
+    keys = [{'sub': u, 'statKey': k} for u in user_ids for k in stat_keys]
+    found = {}
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request = {recommend.TABLE_STATS.name: {'Keys': keys[start:start + BATCH_GET_LIMIT]}}
+        for attempt in range(MAX_RETRIES + 1):
+            res = recommend.dynamodb.batch_get_item(RequestItems=request)
+            for item in res.get('Responses', {}).get(recommend.TABLE_STATS.name, []):
+                found[(item['sub'], item['statKey'])] = item
+            request = res.get('UnprocessedKeys')
+            if not request: break
+            if attempt == MAX_RETRIES:
+                raise RuntimeError(f"Còn {sum(len(v['Keys']) for v in request.values())} key chưa đọc được")
+            # Bị throttle -> chờ tăng dần trước khi gửi lại, tránh dội thêm tải lên bảng
+            time.sleep(min(0.05 * 2 ** attempt, 5.0))
+    return found
+
+def process_segment(args):
+    # Chạy trong process con: boto3 chưa mở kết nối nào trước khi fork nên dùng lại được resource của module
+    segment, total_segments, date_str = args
+    catalog = recommend.get_catalog()
+    plan_date = datetime.strptime(date_str, '%Y-%m-%d')
+    cutoff = recommend.get_recent_cutoff(plan_date)
+    done = failed = 0
+
+    scan_kwargs = {'Segment': segment, 'TotalSegments': total_segments}
+    # batch_writer tự gom 25 item / BatchWriteItem và gửi lại UnprocessedItems
+    with recommend.TABLE_STATS.batch_writer() as batch:
+        while True:
+            page = recommend.TABLE_USERS.scan(**scan_kwargs)
+            users = page.get('Items', [])
+            stats = load_stats([u['sub'] for u in users if u.get('sub')], (recommend.RECENT_DISHES_KEY, recommend.preferences.PREFS_KEY))
+
+            for user in users:
+                sub = user.get('sub')
+                # 1 user lỗi (dữ liệu hồ sơ hỏng...) không làm hỏng cả segment: bỏ qua, user đó tính live
+                try:
+                    blacklist = recommend.blacklist_from_item(stats.get((sub, recommend.RECENT_DISHES_KEY)), cutoff)
+                    prefs_item = stats.get((sub, recommend.preferences.PREFS_KEY))
+                    meals = recommend.compute_plan(user, catalog, blacklist, prefs_item=prefs_item, on_date=plan_date)
+                    # Cùng plan key với request mặc định (mode combo, DEFAULT_OPTIONS lựa chọn)
+                    plan_key = recommend.get_plan_key(user, catalog, 'combo', recommend.DEFAULT_OPTIONS)
+                    item = recommend.build_plan_item(sub, date_str, plan_key, meals)
+                except Exception as e:
+                    print(f"⚠️ Bỏ qua user {sub}: {e}")
+                    failed += 1
+                    continue
+                batch.put_item(Item=item)
+                done += 1
+
+            last_key = page.get('LastEvaluatedKey')
+            if not last_key: break
+            scan_kwargs['ExclusiveStartKey'] = last_key
+    return done, failed
+
+def run(date_str, segments, workers):
+    started = time.time()
+    total = failed = 0
+    tasks = [(s, segments, date_str) for s in range(segments)]
+    with multiprocessing.Pool(workers) as pool:
+        for count, errors in pool.imap_unordered(process_segment, tasks):
+            total += count
+            failed += errors
+            elapsed = time.time() - started
+            print(f"… {total} user ({total / elapsed:.1f} user/s), {failed} lỗi")
+
+    elapsed = time.time() - started
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"🎉 Đã tính trước {total} thực đơn cho ngày {date_str} trong {elapsed:.1f}s ({rate:.1f} user/s)")
+    if failed: print(f"⚠️ {failed} user lỗi, sẽ tính live khi gọi /recommend")
+    return {"users": total, "failed": failed, "seconds": elapsed, "usersPerSecond": rate}
+
+if __name__ == "__main__":
+    tomorrow = (recommend.get_vietnam_time() + timedelta(days=1)).strftime('%Y-%m-%d')
+    parser = argparse.ArgumentParser(description="Tính trước thực đơn cho mọi user")
+    parser.add_argument('--date', default=tomorrow)
+    parser.add_argument('--segments', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+    run(args.date, args.segments, args.workers)
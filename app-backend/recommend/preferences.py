@@ -0,0 +1,43 @@
+from array import array
+from datetime import datetime
+
+from catalog import clean_text
+
+# ============================================================
+# SỞ THÍCH ĂN UỐNG THEO USER (item PREFS trong FoodMind-UserStats, ghi bởi log_meal)
+# 'f#<FoodID>' / 'g#<NutrientGroup>' -> trọng số đã nhân hệ số "forward decay":
+# mỗi lần ăn cộng 2^((ngày - EPOCH) / HALF_LIFE) nên log_meal chỉ cần ADD (atomic),
+# còn khi đọc chia cho 2^((hôm nay - EPOCH) / HALF_LIFE) là ra trọng số đã giảm dần theo thời gian.
+# Hằng số phải khớp với log_meal/main.py.
+# ============================================================
+
+PREFS_KEY = 'PREFS'
+PREF_EPOCH = datetime(2025, 1, 1)
+PREF_HALF_LIFE_DAYS = 30
+GROUP_WEIGHT = 0.5   # Thích 1 nhóm chất thì các món cùng nhóm được cộng ít hơn món đã ăn
+
+def decay_scale(on_date):
+    return 2.0 ** ((on_date - PREF_EPOCH).days / PREF_HALF_LIFE_DAYS)
+
+def preference_scores(catalog, prefs_item, on_date):
+    # Điểm sở thích [0, 1] cho toàn bộ catalog = tích vô hướng (one-hot món + one-hot nhóm) · trọng số user
+    if not prefs_item: return None
+    scale = decay_scale(on_date)
+    index = catalog.memo(('id_index',), lambda: {fid: i for i, fid in enumerate(catalog.ids)})
+    group_index = catalog.memo(('group_index',), lambda: {g: n for n, g in enumerate(catalog.nutrient_groups)})
+
+    food_w = array('f', bytes(4 * len(catalog)))
+    group_w = [0.0] * len(catalog.nutrient_groups)
+    for attr, value in prefs_item.items():
+        if attr.startswith('f#'):
+            i = index.get(attr[2:])
+            if i is not None: food_w[i] = float(value) / scale
+        elif attr.startswith('g#'):
+            g = group_index.get(clean_text(attr[2:]))
+            if g is not None: group_w[g] = float(value) / scale
+
+    nutrient = catalog.nutrient
+    scores = [food_w[i] + GROUP_WEIGHT * group_w[nutrient[i]] for i in range(len(catalog))]
+    top = max(scores)
+    if top <= 0: return None
+    return array('f', (x / top for x in scores))
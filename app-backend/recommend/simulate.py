@@ -0,0 +1,309 @@
+import argparse
+import contextlib
+import copy
+import importlib.util
+import json
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+# ============================================================
+# MÔ PHỎNG OFFLINE: nghìn user ảo x 30 ngày, chạy thật lambda_handler của recommend + log_meal
+# trên DynamoDB giả lập trong bộ nhớ. Báo cáo chất lượng (lệch budget, tỉ lệ lặp món, độ đa dạng)
+# và tốc độ (gợi ý/giây, p50/p99 từng bước) để so sánh trước khi ship thay đổi thuật toán.
+# Chạy: python simulate.py [--users 2000] [--days 30] [--options 2] [--seed 1] [--buffered]
+# ============================================================
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-southeast-1')
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+# 'foods' (đọc catalog, dùng chung) nằm trong layer shared/ -> trên Lambda có sẵn, chạy local thì thêm vào path
+sys.path.append(os.path.join(HERE, '..', 'shared'))
+
+import main as recommend  # noqa: E402
+import foods as shared_foods  # noqa: E402
+
+def _load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# log_meal import 'log_queue' từ thư mục của nó -> thêm vào cuối sys.path để 'main' vẫn là recommend
+sys.path.append(os.path.join(HERE, '..', 'log_meal'))
+log_meal = _load_module('log_meal_main', os.path.join(HERE, '..', 'log_meal', 'main.py'))
+log_queue = sys.modules['log_queue']
+# consumer.py 'import main' -> trỏ lại về log_meal (tên 'main' ở đây là recommend)
+log_consumer = _load_module('log_meal_consumer', os.path.join(HERE, '..', 'log_meal', 'consumer.py'))
+log_consumer.main = log_meal
+
+# ------------------------------------------------------------
+# DynamoDB trong bộ nhớ: chỉ hỗ trợ đúng các lệnh mà handler đang dùng
+# ------------------------------------------------------------
+class ConditionFailed(Exception):
+    pass
+
+class _BatchWriter:
+    def __init__(self, table): self.table = table
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def put_item(self, Item): self.table.put_item(Item=Item)
+
+class MemoryTable:
+    def __init__(self, name, hash_key, range_key=None):
+        self.name, self.hash_key, self.range_key = name, hash_key, range_key
+        self.items = {}
+
+    def _key(self, item):
+        return (item[self.hash_key], item.get(self.range_key) if self.range_key else None)
+
+    def get_item(self, Key, **kwargs):
+        item = self.items.get(self._key(Key))
+        return {'Item': copy.deepcopy(item)} if item else {}
+
+    def put_item(self, Item, **kwargs):
+        self.items[self._key(Item)] = copy.deepcopy(Item)
+        return {}
+
+    def batch_writer(self, **kwargs):
+        return _BatchWriter(self)
+
+    def scan(self, **kwargs):
+        return {'Items': [copy.deepcopy(i) for i in self.items.values()]}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ConditionExpression=None, ReturnValues=None, **kwargs):
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        item = self.items.get(self._key(Key))
+
+        if ConditionExpression:
+            # Chỉ dùng dạng 'attr = :value' hoặc 'attribute_not_exists(attr)'
+            missing = re.match(r'attribute_not_exists\((.+)\)', ConditionExpression)
+            if missing:
+                attr = missing.group(1)
+                ok = not item or names.get(attr, attr) not in item
+            else:
+                attr, placeholder = [x.strip() for x in ConditionExpression.split('=')]
+                ok = item and item.get(names.get(attr, attr)) == values[placeholder]
+            if not ok: raise ConditionFailed(ConditionExpression)
+
+        existed, item = item is not None, item or dict(Key)
+        old, updated = dict(item), set()
+        for action, body in re.findall(r'(SET|ADD|REMOVE)\s+(.+?)(?=\s+(?:SET|ADD|REMOVE)\s+|$)', UpdateExpression):
+            for part in body.split(','):
+                if action == 'REMOVE':
+                    attr = names.get(part.strip(), part.strip())
+                    item.pop(attr, None)
+                elif action == 'SET':
+                    attr, placeholder = [x.strip() for x in part.split('=')]
+                    attr = names.get(attr, attr)
+                    item[attr] = values[placeholder]
+                else:
+                    attr, placeholder = part.split()
+                    attr = names.get(attr, attr)
+                    item[attr] = item.get(attr, 0) + values[placeholder]
+                updated.add(attr)
+        self.items[self._key(Key)] = item
+        # Như DynamoDB: giá trị cũ của mọi thuộc tính được ghi (kể cả ghi lại cùng giá trị), nếu đã có
+        if ReturnValues == 'UPDATED_OLD':
+            return {'Attributes': {k: v for k, v in old.items() if k in updated}}
+        if ReturnValues == 'ALL_OLD':
+            return {'Attributes': old} if existed else {}
+        if ReturnValues == 'ALL_NEW':
+            return {'Attributes': copy.deepcopy(item)}
+        return {}
+
+class MemoryDynamo:
+    def __init__(self, tables):
+        self.tables = {t.name: t for t in tables}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        responses = {}
+        for name, spec in RequestItems.items():
+            table = self.tables[name]
+            found = (table.items.get(table._key(k)) for k in spec['Keys'])
+            responses[name] = [copy.deepcopy(i) for i in found if i]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        for name, requests in RequestItems.items():
+            for r in requests:
+                self.tables[name].put_item(Item=r['PutRequest']['Item'])
+        return {'UnprocessedItems': {}}
+
+def install_memory_db():
+    users = MemoryTable(recommend.TABLE_USERS.name, 'sub')
+    stats = MemoryTable(recommend.TABLE_STATS.name, 'sub', 'statKey')
+    logs = MemoryTable(log_meal.TABLE_LOGS.name, 'sub', 'dateMeal')
+    recommend.TABLE_USERS, recommend.TABLE_STATS = users, stats
+    recommend.dynamodb = log_meal.dynamodb = MemoryDynamo([users, stats, logs])
+    log_meal.TABLE_LOGS, log_meal.TABLE_STATS, log_meal.TABLE_USERS = logs, stats, users
+    # Bảng món của foods.py (dùng chung cho recommend + log_meal): nạp từ catalog.bin, kèm item version
+    # trùng với catalog -> recommend giữ bản đóng gói, không đọc / scan DynamoDB thật
+    catalog = recommend.food_catalog.load()
+    foods = MemoryTable(shared_foods.TABLE_FOODS.name, 'FoodID')
+    for i in range(len(catalog)):
+        foods.put_item(Item=catalog.food(i))
+    foods.put_item(Item={'FoodID': shared_foods.CATALOG_VERSION_ID, 'version': catalog.version})
+    shared_foods.TABLE_FOODS = foods
+    return users, stats, logs
+
+# ------------------------------------------------------------
+# Đo thời gian từng bước bằng cách bọc các hàm của handler
+# ------------------------------------------------------------
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+
+    def wrap(self, module, name, label=None):
+        fn = getattr(module, name)
+        bucket = self.samples.setdefault(label or name, [])
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                bucket.append(time.perf_counter() - start)
+        setattr(module, name, timed)
+
+    def report(self):
+        rows = []
+        for label, xs in self.samples.items():
+            if not xs: continue
+            xs = sorted(xs)
+            p50 = xs[len(xs) // 2] * 1000
+            p99 = xs[min(len(xs) - 1, int(len(xs) * 0.99))] * 1000
+            rows.append((label, len(xs), p50, p99))
+        return rows
+
+# ------------------------------------------------------------
+# User ảo
+# ------------------------------------------------------------
+def make_users(count, catalog, rng):
+    diseases = list(catalog.diseases)
+    users = []
+    for n in range(count):
+        conditions = rng.sample(diseases, rng.choice((0, 0, 0, 1, 1, 2)))
+        users.append({
+            'sub': f'sim-{n:05d}',
+            'tdee': rng.randint(1300, 3200),
+            'limitHealth': ', '.join(conditions) if conditions else 'Không',
+            'updatedAt': '2025-01-01T00:00:00',
+            # Hành vi: xác suất log mỗi bữa, xác suất bấm "Gợi ý" lại 1 bữa
+            '_logRate': rng.uniform(0.2, 1.0),
+            '_refreshRate': rng.uniform(0.0, 0.4)
+        })
+    return users
+
+def call(handler, **params):
+    res = handler({'queryStringParameters': params}, None)
+    return res['statusCode'], json.loads(res['body'])
+
+def simulate_user_day(u, day, options, rng, m):
+    sub = u['sub']
+    status, plan = call(recommend.lambda_handler, userId=sub, options=str(options))
+    if status != 200: raise RuntimeError(plan)
+    m['served'] += 1
+
+    for meal_key in recommend.MEAL_CONFIGS:
+        if rng.random() < u['_refreshRate']:
+            status, fresh = call(recommend.lambda_handler, userId=sub, options=str(options), meal=meal_key)
+            if status != 200: raise RuntimeError(fresh)
+            m['served'] += 1
+            plan[meal_key] = fresh[meal_key]
+
+        meal = plan[meal_key]
+        ids = []
+        for opt in meal['options']:
+            m['fit_errors'].append(abs(opt['totalCalorie'] - meal['budget']) / max(meal['budget'], 1))
+            ids.extend(f['FoodID'] for f in opt['items'])
+        if ids: m['option_diversity'].append(len(set(ids)) / len(ids))
+
+        if not meal['options'] or rng.random() >= u['_logRate']: continue
+        # User chọn 1 phương án bất kỳ và log lại
+        choice = rng.choice(meal['options'])
+        main_id = choice['items'][0]['FoodID']
+        last = u['_eaten'].get(main_id)
+        m['logged'] += 1
+        if last is not None and day - last <= recommend.RECENT_DAYS:
+            m['repeats'] += 1
+        u['_eaten'][main_id] = day
+        body = {'sub': sub, 'logs': [{'meal': meal_key, 'foods': choice['items']}]}
+        log_meal.lambda_handler({'body': json.dumps(body, ensure_ascii=False)}, None)
+
+def run(user_count, days, options, seed, buffered=False):
+    rng = random.Random(seed)
+    random.seed(seed)
+    users_table, _, _ = install_memory_db()
+    catalog = recommend.get_catalog()
+    users = make_users(user_count, catalog, rng)
+    for u in users:
+        users_table.put_item(Item={k: v for k, v in u.items() if not k.startswith('_')})
+        u['_eaten'] = {}   # FoodID món chính -> ngày (index) ăn gần nhất
+
+    timer = StageTimer()
+    for name in ('get_request_items', 'get_history_blacklist', 'compute_plan', 'save_plan', 'lambda_handler'):
+        timer.wrap(recommend, name, f'recommend.{name}')
+    timer.wrap(log_meal, 'lambda_handler', 'log_meal.lambda_handler')
+    # Chế độ buffer: log_meal đẩy vào hàng đợi trong bộ nhớ, consumer ghi theo lô cuối mỗi ngày
+    queue = log_queue.MemoryQueue() if buffered else None
+    log_meal.get_queue = lambda: queue
+    if buffered: timer.wrap(log_consumer, 'process', 'log_meal.consumer.process')
+
+    start_day = datetime(2025, 6, 1, 7)
+    clock = {'now': start_day}
+    recommend.get_vietnam_time = log_meal.get_vietnam_time = lambda: clock['now']
+
+    m = {'served': 0, 'logged': 0, 'repeats': 0, 'fit_errors': [], 'option_diversity': []}
+    started = time.perf_counter()
+    # Nuốt log của handler (vd. "Bỏ qua cập nhật plan") để bảng kết quả dễ đọc
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for day in range(days):
+            clock['now'] = start_day + timedelta(days=day)
+            for u in users:
+                simulate_user_day(u, day, options, rng, m)
+            if buffered: log_consumer.drain(queue)
+    elapsed = time.perf_counter() - started
+
+    fit_errors = sorted(m['fit_errors'])
+    diversity = m['option_diversity']
+    return {
+        "users": user_count,
+        "buffered": buffered,
+        "days": days,
+        "recommendCalls": m['served'],
+        "recommendationsPerSecond": m['served'] / elapsed if elapsed else 0.0,
+        "budgetFitErrorMean": sum(fit_errors) / len(fit_errors) if fit_errors else 0.0,
+        "budgetFitErrorP90": fit_errors[int(len(fit_errors) * 0.9)] if fit_errors else 0.0,
+        "repeatRate": m['repeats'] / m['logged'] if m['logged'] else 0.0,
+        "optionDiversity": sum(diversity) / len(diversity) if diversity else 0.0,
+        "distinctMainsPerUser": sum(len(u['_eaten']) for u in users) / max(user_count, 1),
+        "stages": timer.report(),
+        "seconds": elapsed
+    }
+
+def print_report(r):
+    print(f"👥 {r['users']} user x {r['days']} ngày — {r['recommendCalls']} lần gọi /recommend trong {r['seconds']:.1f}s"
+          + (" (ghi log qua hàng đợi)" if r['buffered'] else ""))
+    print(f"⚡ {r['recommendationsPerSecond']:.1f} gợi ý/giây")
+    print(f"🎯 Lệch budget: trung bình {r['budgetFitErrorMean'] * 100:.1f}%, p90 {r['budgetFitErrorP90'] * 100:.1f}%")
+    print(f"🔁 Tỉ lệ ăn lại món chính trong {recommend.RECENT_DAYS} ngày: {r['repeatRate'] * 100:.2f}%")
+    print(f"🌈 Đa dạng trong 1 bữa (món khác nhau / tổng món): {r['optionDiversity']:.3f}; "
+          f"món chính khác nhau / user: {r['distinctMainsPerUser']:.1f}")
+    print(f"{'Bước':<34}{'Số lần':>10}{'p50 (ms)':>12}{'p99 (ms)':>12}")
+    for label, count, p50, p99 in r['stages']:
+        print(f"{label:<34}{count:>10}{p50:>12.3f}{p99:>12.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mô phỏng offline chất lượng và tốc độ gợi ý")
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--options', type=int, default=recommend.DEFAULT_OPTIONS)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--buffered', action='store_true', help="log_meal ghi qua hàng đợi + consumer theo lô")
+    args = parser.parse_args()
+    print_report(run(args.users, args.days, args.options, args.seed, args.buffered))
@@ -0,0 +1,127 @@
+import random
+import time
+from bisect import bisect_right
+
+from catalog import MEAL_BITS
+from optimizer import enumerate_combos, fit_score, JITTER
+
+# ============================================================
+# THỰC ĐƠN 7 NGÀY (21 bữa): tìm kiếm tham lam + quay lui trên danh sách ứng viên tính sẵn
+# Ràng buộc cứng: 1 món chính không lặp lại trong MIN_GAP_DAYS ngày, tráng miệng không trùng trong ngày.
+# Ràng buộc mềm: ưu tiên món ít được dùng trong tuần, khớp budget.
+# ============================================================
+
+PLAN_DAYS = 7
+MIN_GAP_DAYS = 2     # Món chính đã ăn ngày d thì sớm nhất ngày d + 3 mới được lặp lại
+BRANCH = 6           # Số ứng viên thử ở mỗi bữa trước khi quay lui
+TIME_BUDGET = 0.3    # Giây; hết thời gian thì nới ràng buộc cho các bữa còn lại
+
+def _ranked_mains(mains, desserts, budget, rng):
+    # Mỗi món chính giữ combo khớp budget nhất với nó -> (điểm, món chính)
+    best = {}
+    for ids, total in enumerate_combos(mains, [desserts], budget):
+        score = fit_score(total, budget)
+        if score > best.get(ids[0], -1.0):
+            best[ids[0]] = score
+    ranked = [(score + rng.uniform(0, JITTER), main) for main, score in best.items()]
+    ranked.sort(reverse=True)
+    return [main for _, main in ranked]
+
+def _pick_dessert(desserts, remaining, used_today, week_uses):
+    # Tráng miệng vừa budget, không trùng trong ngày; ưu tiên món ít dùng trong tuần rồi đến món nhiều calo
+    if remaining <= 30: return None
+    hi = bisect_right(desserts.cals, remaining)
+    fits = [d for d in range(hi) if desserts.ids[d] not in used_today]
+    if not fits: return None
+    return min(fits, key=lambda d: (week_uses.get(desserts.ids[d], 0), -desserts.cals[d]))
+
+def plan_week(catalog, budgets, disease_mask, blacklist, meal_configs, rng=random, time_budget=TIME_BUDGET):
+    # budgets: {meal_key: calo}; blacklist: FoodID vừa ăn gần đây (coi như đã ăn hôm qua)
+    deadline = time.perf_counter() + time_budget
+    slots = [(day, meal_key) for day in range(PLAN_DAYS) for meal_key in meal_configs]
+
+    tables = {}
+    for meal_key, config in meal_configs.items():
+        mains, desserts = catalog.candidates(MEAL_BITS[config["db_key"]], disease_mask)
+        tables[meal_key] = (mains, desserts, _ranked_mains(mains, desserts, budgets[meal_key], rng))
+
+    id_to_index = {catalog.ids[i]: i for meal in tables.values() for i in meal[2]}
+    last_day = {id_to_index[f]: -1 for f in blacklist if f in id_to_index}
+    uses = {}
+    chosen = [None] * len(slots)
+    cursor = [0] * len(slots)
+    relaxed = False
+
+    def allowed(main, day):
+        return day - last_day.get(main, -MIN_GAP_DAYS - 1) > MIN_GAP_DAYS
+
+    def ordered(meal_key, day):
+        ranked = tables[meal_key][2]
+        ok = [m for m in ranked if allowed(m, day)]
+        ok.sort(key=lambda m: uses.get(m, 0))  # sort ổn định: ít dùng trước, giữ thứ tự điểm
+        return ok[:BRANCH]
+
+    options = [None] * len(slots)
+    pos = 0
+    while 0 <= pos < len(slots):
+        day, meal_key = slots[pos]
+        if options[pos] is None:
+            options[pos] = ordered(meal_key, day)
+            cursor[pos] = 0
+
+        if cursor[pos] < len(options[pos]):
+            main = options[pos][cursor[pos]]
+            cursor[pos] += 1
+            chosen[pos] = (main, last_day.get(main))
+            last_day[main] = day
+            uses[main] = uses.get(main, 0) + 1
+            pos += 1
+            continue
+
+        # Hết ứng viên: quay lui bữa trước (nếu còn thời gian), hoặc nới ràng buộc
+        if time.perf_counter() < deadline and pos > 0:
+            options[pos] = None
+            pos -= 1
+            main, prev_day = chosen[pos]
+            chosen[pos] = None
+            if main is None: continue
+            uses[main] -= 1
+            if prev_day is None: del last_day[main]
+            else: last_day[main] = prev_day
+            continue
+
+        relaxed = True
+        ranked = tables[meal_key][2]
+        if not ranked:
+            chosen[pos] = (None, None)
+        else:
+            main = min(ranked, key=lambda m: (uses.get(m, 0), last_day.get(m, -99)))
+            chosen[pos] = (main, last_day.get(main))
+            last_day[main] = day
+            uses[main] = uses.get(main, 0) + 1
+        pos += 1
+
+    # Ghép tráng miệng + định dạng kết quả
+    days = [{} for _ in range(PLAN_DAYS)]
+    desserts_today = [set() for _ in range(PLAN_DAYS)]
+    dessert_uses = {}
+    for (day, meal_key), (main, _) in zip(slots, chosen):
+        mains, desserts, _ = tables[meal_key]
+        budget = budgets[meal_key]
+        items, total = [], 0.0
+        if main is not None:
+            items.append(catalog.food(main))
+            total = catalog.calories[main]
+            d = _pick_dessert(desserts, budget - total, desserts_today[day], dessert_uses)
+            if d is not None:
+                dessert = desserts.ids[d]
+                items.append(catalog.food(dessert))
+                total += desserts.cals[d]
+                desserts_today[day].add(dessert)
+                dessert_uses[dessert] = dessert_uses.get(dessert, 0) + 1
+        days[day][meal_key] = {
+            "budget": int(budget),
+            "items": items,
+            "totalCalorie": int(total)
+        }
+    return days, relaxed
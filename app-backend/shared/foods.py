@@ -0,0 +1,82 @@
+import boto3
+import os
+import time
+
+# ============================================================
+# ĐỌC CATALOG MÓN ĂN (FoodMind-Foods) + CHỈ MỤC MÓN TRONG BỘ NHỚ: FoodID -> tên, calo / đơn vị, đơn vị, nhóm chất
+# MealLogs chỉ lưu tham chiếu gọn {FoodID, Portion, Calorie}; tên món lấy lại từ đây khi đọc.
+# Cache ở cấp module (giữ giữa các lần gọi), kiểm tra version catalog sau mỗi CATALOG_TTL giây.
+# Nguồn duy nhất, đóng gói thành layer FoodMindSharedLayer (template.yaml) cho log_meal, History,
+# dashboard, recommend -> mọi Lambda đọc version / scan catalog theo cùng 1 cách.
+# ============================================================
+
+dynamodb = boto3.resource('dynamodb')
+TABLE_FOODS = dynamodb.Table(os.environ.get('FOOD_TABLE', 'FoodMind-Foods'))
+CATALOG_TTL = int(os.environ.get('CATALOG_TTL', '300'))  # giây
+CATALOG_VERSION_ID = '__catalog_version__'  # item đặc biệt trong FoodMind-Foods, ghi bởi loaddata.py
+FOOD_FIELDS = ('FoodID', 'FoodName', 'Calorie', 'Unit', 'NutrientGroup')
+
+_food_cache = {"version": None, "foods": None, "checked_at": 0.0}
+
+def get_catalog_version():
+    # Chỉ đọc 1 item nhỏ (1 thuộc tính) thay vì scan cả bảng
+    res = TABLE_FOODS.get_item(
+        Key={'FoodID': CATALOG_VERSION_ID},
+        ProjectionExpression='#v',
+        ExpressionAttributeNames={'#v': 'version'}
+    )
+    return str(res.get('Item', {}).get('version', ''))
+
+def scan_foods(fields=None):
+    # Duyệt hết các trang (LastEvaluatedKey), bỏ qua item version; fields=None -> đủ thuộc tính
+    scan_kwargs = {}
+    if fields:
+        names = {f'#f{n}': f for n, f in enumerate(fields)}
+        scan_kwargs = {'ProjectionExpression': ', '.join(names), 'ExpressionAttributeNames': names}
+    items = []
+    while True:
+        page = TABLE_FOODS.scan(**scan_kwargs)
+        items.extend(i for i in page.get('Items', []) if i.get('FoodID') and i['FoodID'] != CATALOG_VERSION_ID)
+        last_key = page.get('LastEvaluatedKey')
+        if not last_key: return items
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
+def scan_food_index():
+    return {item['FoodID']: item for item in scan_foods(FOOD_FIELDS)}
+
+def get_food_index(recheck=False):
+    # recheck=True: bỏ qua TTL, đọc lại item version (rẻ) -> chỉ scan lại khi catalog thật sự đổi
+    cache = _food_cache
+    now = time.time()
+    if cache['foods'] is not None and not recheck and now - cache['checked_at'] < CATALOG_TTL:
+        return cache['foods']
+
+    try:
+        version = get_catalog_version()
+    except Exception as e:
+        print(f"Lỗi đọc catalog version: {e}")
+        if cache['foods'] is not None: return cache['foods']  # Giữ bản cũ còn hơn lỗi
+        version = ''
+
+    if cache['foods'] is None or not version or version != cache['version']:
+        cache['foods'] = scan_food_index()
+        cache['version'] = version
+    cache['checked_at'] = now
+    return cache['foods']
+
+def get_food_index_version():
+    # Version catalog của chỉ mục đang cache (gọi sau get_food_index) -> đưa vào ETag vì tên món lấy từ đây
+    return _food_cache['version'] or ''
+
+def hydrate_food(ref, foods):
+    # Tham chiếu gọn -> dict đầy đủ cho client. Log cũ (đã lưu đủ thông tin) giữ nguyên.
+    food = foods.get(ref.get('FoodID')) if ref.get('FoodID') else None
+    if not food: return dict(ref)
+    return {
+        "FoodID": ref['FoodID'],
+        "FoodName": ref.get('FoodName') or food.get('FoodName', ''),
+        "Unit": food.get('Unit', ''),
+        "NutrientGroup": food.get('NutrientGroup', ''),
+        "Portion": ref.get('Portion', 1),
+        "Calorie": ref.get('Calorie', food.get('Calorie', 0))
+    }
@@ -90,7 +90,7 @@ export default function Dashboard() {
         return;
       }
       try {
-        const url = `${process.env.NEXT_PUBLIC_API_URL}/dashboard?userId=${sub}&t=${Date.now()}`;
+        const url = `${process.env.NEXT_PUBLIC_API_URL}/dashboard?userId=${sub}`;
         const res = await axios.get(url);
         setData(res.data);
       } catch (error) {
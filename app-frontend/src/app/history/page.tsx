@@ -23,26 +23,47 @@ type DailyHistory = {
   }[];
 };
 
+// 1 ngày có thể nằm ở ranh giới 2 trang -> gộp bữa + cộng calo theo ngày
+const mergeDays = (current: DailyHistory[], incoming: DailyHistory[]) => {
+  const merged = current.map((d) => ({ ...d, meals: [...d.meals] }));
+  for (const day of incoming) {
+    const existing = merged.find((d) => d.date === day.date);
+    if (existing) {
+      existing.totalCalories += day.totalCalories;
+      existing.meals.push(...day.meals);
+    } else {
+      merged.push(day);
+    }
+  }
+  return merged;
+};
+
 export default function History() {
   const router = useRouter();
   const [historyData, setHistoryData] = useState<DailyHistory[]>([]);
   const [loading, setLoading] = useState(true);
   
-  // State quản lý việc mở rộng danh sách
-  const [isExpanded, setIsExpanded] = useState(false);
+  // Con trỏ trang tiếp theo (null = đã hết lịch sử)
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  const fetchPage = async (cursor?: string) => {
+    const sub = getUserSub();
+    if (!sub) {
+      toast.error("Vui lòng đăng nhập lại");
+      router.push("/auth/signin");
+      return;
+    }
+    const url = `${process.env.NEXT_PUBLIC_API_URL}/history?userId=${sub}` + (cursor ? `&cursor=${cursor}` : "");
+    const res = await axios.get(url);
+    setHistoryData((prev) => mergeDays(cursor ? prev : [], res.data.days));
+    setNextCursor(res.data.nextCursor);
+  };
 
   useEffect(() => {
     const fetchData = async () => {
-      const sub = getUserSub();
-      if (!sub) {
-        toast.error("Vui lòng đăng nhập lại");
-        router.push("/auth/signin");
-        return;
-      }
       try {
-        const url = `${process.env.NEXT_PUBLIC_API_URL}/history?userId=${sub}&t=${Date.now()}`;
-        const res = await axios.get(url);
-        setHistoryData(res.data);
+        await fetchPage();
       } catch (error) {
         console.error("Lỗi tải lịch sử:", error);
         toast.error("Không thể tải dữ liệu.");
@@ -53,9 +74,18 @@ export default function History() {
     fetchData();
   }, []);
 
-  // Nếu đã mở rộng (isExpanded = true) -> Lấy hết
-  // Nếu chưa -> Chỉ lấy 3 ngày đầu tiên
-  const visibleData = isExpanded ? historyData : historyData.slice(0, 3);
+  const handleLoadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      await fetchPage(nextCursor);
+    } catch (error) {
+      console.error("Lỗi tải thêm lịch sử:", error);
+      toast.error("Không thể tải thêm dữ liệu.");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   if (loading) {
     return (
@@ -72,7 +102,7 @@ export default function History() {
         {/* Header */}
         <div className="text-center pt-4 mb-8">
           <h1 className="text-2xl md:text-3xl font-bold text-gray-800">Nhật Ký Ăn Uống</h1>
-          <p className="text-gray-500 text-sm">Lịch sử dinh dưỡng trong 7 ngày qua</p>
+          <p className="text-gray-500 text-sm">Lịch sử dinh dưỡng của bạn</p>
         </div>
 
         {historyData.length === 0 ? (
@@ -82,7 +112,7 @@ export default function History() {
         ) : (
           <div className="space-y-4">
             {/* Render danh sách các ngày */}
-            {visibleData.map((day) => (
+            {historyData.map((day) => (
               <Card key={day.date} className="overflow-hidden bg-white shadow-md border-l-4 border-l-green-500">
                 {/* Header của Card Ngày */}
                 <div className="p-4 bg-gray-50 border-b flex justify-between items-center">
@@ -125,23 +155,25 @@ export default function History() {
           </div>
         )}
 
-        {/* Nút Xem Tất Cả (Chỉ hiện khi dữ liệu nhiều hơn 3 và chưa mở rộng) */}
-        {!isExpanded && historyData.length > 3 && (
+        {/* Nút Xem thêm (Chỉ hiện khi còn trang cũ hơn) */}
+        {nextCursor && (
           <div className="flex justify-center pt-4">
             <Button 
-              onClick={() => setIsExpanded(true)}
+              onClick={handleLoadMore}
+              disabled={loadingMore}
               variant="outline"
               className="bg-white border-green-200 text-green-700 hover:bg-green-50 px-8 py-2 rounded-full shadow-sm"
             >
-              Xem tất cả 7 ngày <ChevronDown className="w-4 h-4 ml-2" />
+              {loadingMore ? <Loader2 className="w-4 h-4 mr-2 animate-spin" /> : null}
+              Xem thêm <ChevronDown className="w-4 h-4 ml-2" />
             </Button>
           </div>
         )}
 
-        {/* Thông báo hết danh sách (Khi đã mở rộng) */}
-        {isExpanded && (
+        {/* Thông báo hết danh sách */}
+        {!nextCursor && historyData.length > 0 && (
           <p className="text-center text-xs text-gray-400 pt-4">
-            Đã hiển thị toàn bộ lịch sử 7 ngày gần nhất.
+            Đã hiển thị toàn bộ lịch sử.
           </p>
         )}
 
@@ -20,6 +20,7 @@ type FoodItem = {
   Calorie: number;
   Unit: string;
   Category: string;
+  Portion?: number;
 };
 type MealOption = { items: FoodItem[]; totalCalorie: number; };
 type MealRecommendation = { budget: number; options: MealOption[]; };
@@ -88,7 +89,7 @@ export default function Recommend() {
     if (!isInitialLoad) setLoading(true);
 
     try {
-      const res = await axios.get(`${process.env.NEXT_PUBLIC_API_URL}/recommend?userId=${sub}&t=${Date.now()}`);
+      const res = await axios.get(`${process.env.NEXT_PUBLIC_API_URL}/recommend?userId=${sub}`);
       setData(res.data);
       const today = new Date().toISOString().split('T')[0];
       localStorage.setItem(`savedMenu_${today}`, JSON.stringify(res.data));
@@ -100,6 +101,30 @@ export default function Recommend() {
     }
   };
 
+  // Chỉ tính lại 1 bữa (meal=...), giữ nguyên 2 bữa còn lại
+  const fetchMeal = async (mealKey: string) => {
+    const sub = getUserSub();
+    if (!sub) return router.push("/auth/signin");
+
+    // Gửi kèm các món đang hiện để server loại khỏi món chính -> "đổi món" luôn ra món khác
+    const shown = data?.[mealKey as keyof RecommendResponse]?.options.flatMap(o => o.items.map(f => f.FoodID)) ?? [];
+    const exclude = shown.length ? `&exclude=${encodeURIComponent(Array.from(new Set(shown)).join(','))}` : '';
+
+    try {
+      const res = await axios.get(`${process.env.NEXT_PUBLIC_API_URL}/recommend?userId=${sub}&meal=${mealKey}${exclude}`);
+      setData(prev => {
+        if (!prev) return prev;
+        const merged = { ...prev, [mealKey]: res.data[mealKey] };
+        const today = new Date().toISOString().split('T')[0];
+        localStorage.setItem(`savedMenu_${today}`, JSON.stringify(merged));
+        return merged;
+      });
+    } catch (e) {
+      console.error(e);
+      toast.error("Lỗi tải thực đơn");
+    }
+  };
+
   const handleRefreshMeal = async (mealKey: string) => {
     const currentCount = mealStates[mealKey].refreshCount;
     if (currentCount >= MAX_LIMIT) {
@@ -126,7 +151,7 @@ export default function Recommend() {
       </span>);
     }
 
-    await fetchData(); 
+    await fetchMeal(mealKey);
 
     updateMealState(mealKey, { refreshCount: currentCount + 1 });
     setSelections(prev => ({ ...prev, [mealKey]: { main: null, dessert: null } }));
@@ -154,7 +179,8 @@ export default function Recommend() {
     try {
       await axios.post(`${process.env.NEXT_PUBLIC_API_URL}/meals`, {
         sub: sub,
-        logs: [{ meal: mealKey, foods: foods }]
+        // Chỉ gửi tham chiếu: server tự tính calo từ catalog
+        logs: [{ meal: mealKey, foods: foods.map(f => ({ FoodID: f.FoodID, Portion: f.Portion ?? 1 })) }]
       });
 
       updateMealState(mealKey, { isSaved: true });
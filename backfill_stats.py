@@ -0,0 +1,148 @@
+import argparse
+import boto3
+from bisect import bisect_right
+from decimal import Decimal
+from boto3.dynamodb.conditions import Key
+
+# ============================================================
+# BACKFILL TỔNG HỢP TỪ MEALLOGS -> FoodMind-UserStats (chạy 1 lần sau khi deploy)
+# Dashboard / trends / summary / projection chỉ đọc DAY#, MONTH#, YEAR#; log cũ (trước khi có
+# các item này) được cộng lại ở đây. Mọi giá trị được SET tuyệt đối tính từ MealLogs
+# -> chạy lại bao nhiêu lần cũng ra cùng kết quả.
+# Nên chạy lúc ít traffic: log ghi đúng lúc script đang tính lại user đó có thể bị ghi đè
+# (chạy lại script cho user đó là đủ).
+# Chạy: python backfill_stats.py [--user SUB ...]
+# ============================================================
+
+dynamodb = boto3.resource('dynamodb', region_name='ap-southeast-1')
+TABLE_USERS = dynamodb.Table('FoodMind-Users')
+TABLE_LOGS = dynamodb.Table('FoodMind-MealLogs')
+TABLE_HISTORY = dynamodb.Table('FoodMind-Update-Tdee')
+TABLE_STATS = dynamodb.Table('FoodMind-UserStats')
+
+# Khớp với log_meal/main.py
+DAY_PREFIX = 'DAY#'
+MONTH_PREFIX = 'MONTH#'
+YEAR_PREFIX = 'YEAR#'
+MEAL_TYPES = ('breakfast', 'lunch', 'dinner')
+TDEE_BAND = Decimal('0.1')
+
+def query_all(table, **kwargs):
+    items = []
+    while True:
+        res = table.query(**kwargs)
+        items.extend(res.get('Items', []))
+        if 'LastEvaluatedKey' not in res: return items
+        kwargs['ExclusiveStartKey'] = res['LastEvaluatedKey']
+
+def scan_users():
+    kwargs = {'ProjectionExpression': '#s, #t', 'ExpressionAttributeNames': {'#s': 'sub', '#t': 'tdee'}}
+    while True:
+        res = TABLE_USERS.scan(**kwargs)
+        yield from res.get('Items', [])
+        if 'LastEvaluatedKey' not in res: return
+        kwargs['ExclusiveStartKey'] = res['LastEvaluatedKey']
+
+def day_status(total, tdee):
+    if total > tdee * (1 + TDEE_BAND): return 'over'
+    if total < tdee * (1 - TDEE_BAND): return 'under'
+    return 'ok'
+
+def build_days(logs):
+    # 1 log / (ngày, bữa) vì dateMeal là sort key -> cộng thẳng
+    days = {}
+    for log in logs:
+        meal = log.get('mealType')
+        if meal not in MEAL_TYPES or not log.get('dateShort'): continue
+        day = days.setdefault(log['dateShort'], {'meals': {}, 'count': 0, 'at': 0})
+        day['meals'][meal] = Decimal(str(log.get('totalCalories', 0)))
+        day['count'] += 1
+        day['at'] = max(day['at'], int(log.get('loggedAt', 0)))
+    return days
+
+def tdee_lookup(user_id, current_tdee):
+    # TDEE tại từng ngày = lần cập nhật cuối cùng trong hoặc trước ngày đó (như dashboard)
+    history = sorted(query_all(TABLE_HISTORY, KeyConditionExpression=Key('sub').eq(user_id)),
+                     key=lambda x: x.get('updatedAt', ''))
+    dates = [h.get('updatedAt', '')[:10] for h in history]
+    tdees = [Decimal(str(h.get('tdee', current_tdee))) for h in history]
+
+    def lookup(date_str):
+        idx = bisect_right(dates, date_str) - 1
+        return tdees[idx] if idx >= 0 else current_tdee
+    return lookup
+
+def set_item(user_id, stat_key, values, extra='', remove=()):
+    names = {f'#a{n}': k for n, k in enumerate(values)}
+    vals = {f':a{n}': v for n, v in enumerate(values.values())}
+    sets = [f'#a{n} = :a{n}' for n in range(len(values))]
+    if extra: sets.append(extra)
+    expr = 'SET ' + ', '.join(sets)
+    if remove:
+        names.update({f'#r{n}': k for n, k in enumerate(remove)})
+        expr += ' REMOVE ' + ', '.join(f'#r{n}' for n in range(len(remove)))
+    TABLE_STATS.update_item(
+        Key={'sub': user_id, 'statKey': stat_key},
+        UpdateExpression=expr,
+        ExpressionAttributeNames={**names, '#ver': 'version'} if extra else names,
+        ExpressionAttributeValues={**vals, ':one': 1} if extra else vals
+    )
+
+def backfill_user(user_id, current_tdee):
+    logs = query_all(TABLE_LOGS, KeyConditionExpression=Key('sub').eq(user_id),
+                     ProjectionExpression='#d, #m, #c, #l',
+                     ExpressionAttributeNames={'#d': 'dateShort', '#m': 'mealType',
+                                               '#c': 'totalCalories', '#l': 'loggedAt'})
+    days = build_days(logs)
+    if not days: return 0
+    tdee_at = tdee_lookup(user_id, current_tdee)
+
+    rollups = {}
+    for date_str, day in sorted(days.items()):
+        total = sum(day['meals'].values())
+        status = day_status(total, tdee_at(date_str))
+        # version: giữ nguyên nếu đã có (log_meal / recommend dùng để so sánh, không cần đếm đúng).
+        # DAY# không lưu tổng ngày (bên đọc cộng các bữa) -> xoá 'total' của bản backfill cũ
+        set_item(user_id, f'{DAY_PREFIX}{date_str}', {
+            **day['meals'],
+            'logCount': day['count'],
+            'lastLoggedAt': day['at'],
+            'updatedAt': day['at'],
+            'status': status
+        }, extra='#ver = if_not_exists(#ver, :one)', remove=('total',))
+
+        for stat_key in (f'{MONTH_PREFIX}{date_str[:7]}', f'{YEAR_PREFIX}{date_str[:4]}'):
+            r = rollups.setdefault(stat_key, {'total': Decimal(0), **{m: Decimal(0) for m in MEAL_TYPES},
+                                              'days': 0, 'over': 0, 'under': 0})
+            r['total'] += total
+            for meal, cal in day['meals'].items():
+                r[meal] += cal
+            r['days'] += 1
+            if status in ('over', 'under'): r[status] += 1
+
+    for stat_key, values in rollups.items():
+        set_item(user_id, stat_key, values)
+    return len(days)
+
+def run(user_ids=None):
+    users = [{'sub': u} for u in user_ids] if user_ids else scan_users()
+    done = 0
+    for user in users:
+        user_id = user['sub']
+        current_tdee = Decimal(str(user.get('tdee', 2000)))
+        if user_ids:
+            item = TABLE_USERS.get_item(Key={'sub': user_id}).get('Item') or {}
+            current_tdee = Decimal(str(item.get('tdee', 2000)))
+        try:
+            count = backfill_user(user_id, current_tdee)
+            done += 1
+            print(f"✅ {user_id}: {count} ngày")
+        except Exception as e:
+            print(f"❌ {user_id}: {e}")
+    print(f"\n🎉 HOÀN TẤT! Đã backfill {done} user.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill DAY# / MONTH# / YEAR# từ MealLogs")
+    parser.add_argument('--user', action='append', help="Chỉ chạy cho user này (lặp lại được)")
+    args = parser.parse_args()
+    run(args.user)
@@ -2,6 +2,7 @@ import boto3
 import json
 from decimal import Decimal
 import os
+import hashlib
 
 # Tên file dữ liệu
 JSON_FILE = 'D:/a_Bao_Nguyen/AWS_FOODMIND/foodmind-foods.json'
@@ -10,6 +11,9 @@ JSON_FILE = 'D:/a_Bao_Nguyen/AWS_FOODMIND/foodmind-foods.json'
 dynamodb = boto3.resource('dynamodb', region_name='ap-southeast-1')
 table = dynamodb.Table('FoodMind-Foods')
 
+# Item đánh dấu phiên bản catalog: Lambda recommend chỉ scan lại bảng khi giá trị này đổi
+CATALOG_VERSION_ID = '__catalog_version__'
+
 def load_data():
     # Kiểm tra file có tồn tại không
     if not os.path.exists(JSON_FILE):
@@ -21,8 +25,9 @@ def load_data():
     try:
         # Mở file và đọc JSON
         # parse_float=Decimal: Tự động chuyển số thực (400.0) thành Decimal để DynamoDB chịu nhận
-        with open(JSON_FILE, 'r', encoding='utf-8') as f:
-            foods_data = json.load(f, parse_float=Decimal)
+        with open(JSON_FILE, 'rb') as f:
+            raw = f.read()
+        foods_data = json.loads(raw.decode('utf-8'), parse_float=Decimal)
             
         print(f"🚀 Bắt đầu nạp {len(foods_data)} món ăn vào DynamoDB...")
 
@@ -31,6 +36,11 @@ def load_data():
             for food in foods_data:
                 batch.put_item(Item=food)
                 print(f"✅ Đã cập nhật: {food.get('FoodName')} (ID: {food.get('FoodID')})")
+
+        # Ghi version SAU khi nạp xong để cache không đọc phải dữ liệu dở dang
+        version = hashlib.sha1(raw).hexdigest()[:12]
+        table.put_item(Item={'FoodID': CATALOG_VERSION_ID, 'version': version})
+        print(f"🔖 Catalog version: {version}")
         
         print("\n🎉 HOÀN TẤT! Dữ liệu đã an toàn trên Cloud.")
 